@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+# Run without display and sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+HOME = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HOME)
+
+import pygame  # noqa: E402
+
+from modules.assets import AssetManager  # noqa: E402
+from modules.background import Background, GiftLegend  # noqa: E402
+from modules.progress_bar import ProgressBar  # noqa: E402
+from modules.quiz import QuizHandler, QuestionHandler, AnswersHandler  # noqa: E402
+from modules.question_bank import QuestionBank, QuestionIngestor  # noqa: E402
+from modules.sound import SilentSynthesizer  # noqa: E402
+from modules.votes import VoteTally  # noqa: E402
+from modules.events import GiftEvent  # noqa: E402
+
+SOURCE_DIR = os.path.join(HOME, "source")
+FONT_PATH = os.path.join(SOURCE_DIR, "fonts", "Rubik-Medium.ttf")
+SCREEN_SIZES = [(360, 640), (468, 832), (720, 1280)]
+TEXTS = {
+    "short": ("Who wrote Hamlet?",
+              "Shakespeare", ["Marlowe", "Jonson", "Kyd"]),
+    "long": ("Which of the following famous scientists was awarded the Nobel Prize in Physics "
+             "in 1921 for services to theoretical physics and the discovery of the law of the "
+             "photoelectric effect?",
+             "Albert Einstein", ["Niels Bohr, the Danish physicist",
+                                 "Max Planck, the originator of quantum theory",
+                                 "Marie Sklodowska Curie"]),
+}
+
+
+def measure(function, repeats: int) -> dict:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    times.sort()
+    return {"mean_ms": statistics.mean(times) * 1000,
+            "p50_ms": times[len(times) // 2] * 1000,
+            "p95_ms": times[int(len(times) * 0.95)] * 1000}
+
+
+def create_vote_tally() -> VoteTally:
+    vote_tally = VoteTally(gift_indexes={"a": 0, "b": 1, "c": 2, "d": 3})
+    vote_tally.totals = [12, 40, 7, 25]
+    vote_tally.total = sum(vote_tally.totals)
+    vote_tally.shares = [votes / (vote_tally.total + 1) for votes in vote_tally.totals]
+
+    return vote_tally
+
+
+def vote(vote_tally: VoteTally, votes: int = 5) -> None:
+    # Gifts of one busy frame
+    vote_tally.submit([GiftEvent(user=f"user_{random.randrange(100)}",
+                                 gift=random.choice("abcd"),
+                                 count=1,
+                                 timestamp=time.time()) for _ in range(votes)])
+    vote_tally.update()
+
+
+def create_json_dir(tmp_dir: str) -> str:
+    # Synthetic bank so QuizHandler does not need downloaded questions
+    question_bank = QuestionBank(db_path=os.path.join(tmp_dir, "questions.db"))
+    questions = []
+    for i in range(200):
+        question, correct_answer, incorrect_answers = random.choice(list(TEXTS.values()))
+        questions.append({"type": "multiple",
+                          "category": "Benchmark",
+                          "difficulty": "easy",
+                          "question": f"{question} ({i})",
+                          "correct_answer": correct_answer,
+                          "incorrect_answers": incorrect_answers})
+    QuestionIngestor(question_bank=question_bank).ingest(questions)
+    question_bank.close()
+
+    return tmp_dir
+
+
+def run_screen(screen_size: tuple, json_dir: str, repeats: int) -> dict:
+    screen = pygame.display.set_mode(screen_size)
+    vote_tally = create_vote_tally()
+    results = {}
+
+    assets = AssetManager(source_dir=SOURCE_DIR,
+                          screen_size=screen_size,
+                          cache_dir=os.path.join(json_dir, "cache"))
+
+    background = Background(source_dir=SOURCE_DIR,
+                            screen_size=screen_size,
+                            assets=assets)
+    results["Background.render"] = measure(
+        lambda: background.render(screen), repeats)
+
+    progress_bar = ProgressBar(screen_size=screen_size)
+    results["ProgressBar.render"] = measure(
+        lambda: progress_bar.render(screen, random.uniform(0, 30), 30), repeats)
+
+    gift_legend = GiftLegend(screen_size=screen_size,
+                             source_dir=SOURCE_DIR,
+                             assets=assets)
+    results["GiftLegend.render"] = measure(
+        lambda: gift_legend.render(screen), repeats)
+
+    for name, (question, correct_answer, incorrect_answers) in TEXTS.items():
+        question_handler = QuestionHandler(question=question,
+                                           screen_size=screen_size,
+                                           font_path=FONT_PATH,
+                                           color=(255, 255, 255))
+        results[f"QuestionHandler.render[{name}]"] = measure(
+            lambda: question_handler.render(screen), repeats)
+        results[f"QuestionHandler.update_question[{name}]"] = measure(
+            lambda: question_handler.update_question(question), max(1, repeats // 10))
+
+        answers_handler = AnswersHandler(correct_answer=correct_answer,
+                                         incorrect_answers=incorrect_answers,
+                                         screen_size=screen_size,
+                                         font_path=FONT_PATH,
+                                         color=(0, 0, 0))
+        results[f"AnswersHandler.render[{name}]"] = measure(
+            lambda: answers_handler.render(screen, vote_tally), repeats)
+
+        voting_tally = VoteTally(gift_indexes={"a": 0, "b": 1, "c": 2, "d": 3})
+        results[f"AnswersHandler.render[{name}, voting]"] = measure(
+            lambda: (vote(voting_tally), answers_handler.render(screen, voting_tally)), repeats)
+
+    quiz_handler = QuizHandler(json_dir=json_dir,
+                               font_dir=os.path.join(SOURCE_DIR, "fonts"),
+                               source_dir=json_dir,
+                               screen_size=screen_size,
+                               synthesizer=SilentSynthesizer())
+    results["QuizHandler.update_quiz"] = measure(
+        quiz_handler.update_quiz, max(1, repeats // 10))
+    quiz_handler.voice_maker.executor.shutdown(wait=True)
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time rendering of every component without display and sound card.")
+    parser.add_argument("--repeats", type=int, default=500)
+    parser.add_argument("--output", type=str, default=None,
+                        help="Path of the JSON results, printed if not set.")
+    args = parser.parse_args()
+
+    pygame.init()
+    random.seed(0)
+
+    results = {"pygame": pygame.version.ver,
+               "sdl": ".".join(map(str, pygame.get_sdl_version())),
+               "repeats": args.repeats,
+               "screens": {}}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_dir = create_json_dir(tmp_dir)
+        for screen_size in SCREEN_SIZES:
+            key = f"{screen_size[0]}x{screen_size[1]}"
+            results["screens"][key] = run_screen(screen_size, json_dir, args.repeats)
+            print(f"{key}:")
+            for name, stats in results["screens"][key].items():
+                print(f"  {name:45} mean {stats['mean_ms']:7.3f} ms  p95 {stats['p95_ms']:7.3f} ms")
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
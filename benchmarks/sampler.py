@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.sampler import QuestionSampler  # noqa: E402
+
+
+def old_pick(size: int, used_idxs: list) -> int:
+    # Previous QuizGetter.get_random_question
+    free_idxs = [i for i in range(size) if i not in used_idxs]
+    rand_idx = random.choice(free_idxs)
+    used_idxs.append(rand_idx)
+
+    return rand_idx
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare question samplers on a synthetic bank.")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--picks", type=int, default=10_000)
+    parser.add_argument("--old-picks", type=int, default=5)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    results = {"size": args.size}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state_path = os.path.join(tmp_dir, "sampler.bin")
+
+        start = time.perf_counter()
+        sampler = QuestionSampler(size=args.size,
+                                  state_path=state_path,
+                                  avoid_last=100)
+        results["shuffle_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.picks):
+            sampler.next()
+        results["pick_us"] = (time.perf_counter() - start) / args.picks * 1e6
+
+        start = time.perf_counter()
+        QuestionSampler(size=args.size, state_path=state_path)
+        results["restore_s"] = time.perf_counter() - start
+
+    used_idxs = list(range(args.picks))
+    start = time.perf_counter()
+    for _ in range(args.old_picks):
+        old_pick(args.size, used_idxs)
+    results["old_pick_us"] = (time.perf_counter() - start) / args.old_picks * 1e6
+
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
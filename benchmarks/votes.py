@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.events import GiftEvent  # noqa: E402
+from modules.votes import VoteTally  # noqa: E402
+
+GIFTS = ["chocolate", "ice_cream", "rose", "soccer"]
+
+
+def create_events(count: int, users: int) -> list:
+    start = time.time()
+    return [GiftEvent(user=f"user_{random.randrange(users)}",
+                      gift=random.choice(GIFTS),
+                      count=random.choice((1, 1, 1, 5, 99)),
+                      timestamp=start + i / 10000)
+            for i in range(count)]
+
+
+def run(events: list, batch_size: int, **kwargs) -> dict:
+    vote_tally = VoteTally(gift_indexes={gift: i for i, gift in enumerate(GIFTS)},
+                           gift_weights={"soccer": 5},
+                           **kwargs)
+
+    # Events of one frame are submitted as a batch and coalesced once
+    start = time.perf_counter()
+    for i in range(0, len(events), batch_size):
+        vote_tally.submit(events[i:i + batch_size])
+        vote_tally.update()
+    elapsed = time.perf_counter() - start
+
+    return {"events_per_s": len(events) / elapsed,
+            "update_us": elapsed / (len(events) / batch_size) * 1e6,
+            "total": vote_tally.total}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure throughput of the vote tally.")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="Events per frame, 500 at 60 FPS is 30k events/s.")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    events = create_events(args.events, args.users)
+    results = {"events": args.events,
+               "batch_size": args.batch_size,
+               "no_limit": run(events, args.batch_size),
+               "user_limit": run(events, args.batch_size, user_limit=50),
+               "user_limit_window": run(events, args.batch_size, user_limit=50, user_window=5)}
+
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
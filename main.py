@@ -1,8 +1,16 @@
 import os
 import time
+import asyncio
+import argparse
 
-from modules.opentdb import OpentdbAPIHandler
-from modules.game import GameCreator
+# Startup is timed from the first line, imports take most of it
+start_time = time.perf_counter()
+
+from modules.timing import StartupTimer  # noqa: E402
+
+startup_timer = StartupTimer(start_time)
+with startup_timer.phase("imports"):
+    from modules.game import GameCreator  # noqa: E402
 
 HOME = os.getcwd()
 JSON_DIR = os.path.join(HOME, 'data')
@@ -10,17 +18,30 @@ SOURCE_DIR = os.path.join(HOME, 'source')
 
 
 def main() -> None:
-    # # Download questions
+    parser = argparse.ArgumentParser(description="Run the quiz.")
+    parser.add_argument("--account", type=str, default=None,
+                        help="TikTok live to take gifts from on the game event loop.")
+    parser.add_argument("--port", type=int, default=5577,
+                        help="Gift port for a separately started tiktok.py.")
+    args = parser.parse_args()
+
+    # # Download questions, requests is imported only for it
+    # from modules.opentdb import OpentdbAPIHandler
     # api_handler = OpentdbAPIHandler(json_dir=JSON_DIR)
-    # api_handler.download_questions(q_type="multiple")
-    # time.sleep(60)
-    # api_handler.download_questions(q_type="boolean")
+    # api_handler.download_questions(q_types=("multiple", "boolean"))
 
-    # Run game
+    # Run game, gifts come from the socket or from the client on the same loop
     game_creator = GameCreator(json_dir=JSON_DIR,
                                source_dir=SOURCE_DIR,
-                               screen_size=(468, 832))
-    game_creator.run()
+                               screen_size=(468, 832),
+                               gift_port=None if args.account is not None else args.port,
+                               startup_timer=startup_timer)
+    if args.account is None:
+        game_creator.run()
+        return
+
+    from tiktok import run_with_game
+    asyncio.run(run_with_game(game_creator, args.account))
 
 
 if __name__ == "__main__":
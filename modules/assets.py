@@ -0,0 +1,181 @@
+from typing import Tuple, List, Dict, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+import os
+import json
+import time
+import threading
+
+import pygame
+from pygame import mixer
+
+
+class AssetManager:
+    def __init__(self,
+                 source_dir: str,
+                 screen_size: Tuple[int, int],
+                 cache_dir: Optional[str] = None,
+                 workers: int = 4) -> None:
+        # Paths, scaled images depend on the screen size
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(
+            source_dir, "cache")
+        self.size_dir = os.path.join(
+            self.cache_dir, f"{screen_size[0]}x{screen_size[1]}")
+        self.manifest_path = os.path.join(self.size_dir, "manifest.json")
+        os.makedirs(self.size_dir, exist_ok=True)
+
+        # Shared references of converted images and decoded sounds
+        self.images: Dict[Tuple[str, Optional[Tuple[int, int]]], pygame.Surface] = {}
+        self.sounds: Dict[str, mixer.Sound] = {}
+        self.lock = threading.Lock()
+
+        # Images requested in this run, preloaded on the next start
+        self.manifest = self.load_manifest()
+        self.manifest_changed = False
+
+        # Statistics of the disk cache
+        self.hits = 0
+        self.misses = 0
+
+        self.workers = workers
+
+    def load_manifest(self) -> List[Tuple[str, Optional[Tuple[int, int]]]]:
+        if not os.path.exists(self.manifest_path):
+            return []
+
+        with open(self.manifest_path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+
+        return [(os.path.join(self.source_dir, path), tuple(size) if size is not None else None)
+                for path, size in manifest]
+
+    def save_manifest(self) -> None:
+        if self.manifest_changed is False:
+            return
+
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump([(os.path.relpath(path, self.source_dir), size)
+                       for path, size in self.manifest], file)
+        os.replace(tmp_path, self.manifest_path)
+
+        self.manifest_changed = False
+
+    def list_files(self, directory: str, extensions: Sequence[str]) -> List[str]:
+        directory = os.path.join(self.source_dir, directory)
+        if not os.path.isdir(directory):
+            return []
+
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if os.path.splitext(name)[1].lower() in extensions]
+
+    def cache_path(self, path: str, size: Tuple[int, int]) -> str:
+        name = os.path.relpath(path, self.source_dir).replace(os.sep, "__")
+        return os.path.join(self.size_dir, f"{name}.{size[0]}x{size[1]}.rgba")
+
+    def read_image(self,
+                   path: str,
+                   size: Optional[Tuple[int, int]] = None,
+                   original: Optional[pygame.Surface] = None) -> pygame.Surface:
+        # Decode and scale an image, safe to call from worker threads
+        if size is None:
+            return pygame.image.load(path)
+
+        # Scaled variants are stored as raw pixels, newer source files invalidate them
+        cache_path = self.cache_path(path, size)
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with open(cache_path, "rb") as file:
+                data = file.read()
+            if len(data) == size[0] * size[1] * 4:
+                with self.lock:
+                    self.hits += 1
+                return pygame.image.frombytes(data, size, "RGBA")
+
+        if original is None:
+            original = pygame.image.load(path)
+        image = pygame.transform.scale(original, size)
+        with self.lock:
+            self.misses += 1
+
+        # Games sharing the cache write their own temporary files
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(pygame.image.tobytes(image, "RGBA"))
+        os.replace(tmp_path, cache_path)
+
+        return image
+
+    def add_image(self,
+                  path: str,
+                  size: Optional[Tuple[int, int]],
+                  image: pygame.Surface,
+                  remember: bool = True) -> pygame.Surface:
+        # Conversion to the display format makes every later blit cheaper
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+
+        key = (path, size)
+        with self.lock:
+            image = self.images.setdefault(key, image)
+            if remember is True and key not in self.manifest:
+                self.manifest.append(key)
+                self.manifest_changed = True
+
+        return image
+
+    def image(self, path: str, size: Optional[Tuple[int, int]] = None) -> pygame.Surface:
+        size = tuple(size) if size is not None else None
+        with self.lock:
+            image = self.images.get((path, size))
+            original = self.images.get((path, None))
+
+        if image is None:
+            image = self.add_image(path, size, self.read_image(path, size, original))
+
+        return image
+
+    @staticmethod
+    def load_sound(path: str) -> mixer.Sound:
+        return mixer.Sound(path)
+
+    def sound(self, path: str) -> mixer.Sound:
+        with self.lock:
+            sound = self.sounds.get(path)
+
+        if sound is None:
+            sound = self.load_sound(path)
+            with self.lock:
+                sound = self.sounds.setdefault(path, sound)
+
+        return sound
+
+    def preload(self) -> None:
+        start_time = time.perf_counter()
+
+        # Scaled variants of the last run, or all source images on the first start
+        images = [(path, size) for path, size in self.manifest if os.path.exists(path)]
+        remember = len(images) > 0
+        if remember is False:
+            images = [(path, None) for directory in ("gifts", "icons")
+                      for path in self.list_files(directory, (".png", ".jpg"))]
+        sounds = self.list_files(os.path.join("sounds", "effects"), (".wav", ".mp3", ".ogg"))
+
+        # Decoding runs in parallel, conversion needs the display and stays on this thread
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix="asset") as executor:
+            image_futures = [executor.submit(self.read_image, path, size)
+                             for path, size in images]
+            sound_futures = [executor.submit(self.load_sound, path)
+                             for path in sounds]
+
+            for (path, size), future in zip(images, image_futures):
+                self.add_image(path, size, future.result(), remember)
+
+            for path, future in zip(sounds, sound_futures):
+                with self.lock:
+                    self.sounds.setdefault(path, future.result())
+
+        print(f"Preloaded {len(images)} images and {len(sounds)} sounds in "
+              f"{(time.perf_counter() - start_time) * 1000:.1f} ms, "
+              f"disk cache hits: {self.hits}, misses: {self.misses}.")
@@ -0,0 +1,127 @@
+from typing import Tuple, List, Dict, Hashable, Sequence, Union
+
+import threading
+
+import pygame
+
+from .fonts import font_pool
+
+
+class TextureAtlas:
+    def __init__(self,
+                 page_size: Tuple[int, int] = (512, 512),
+                 padding: int = 1) -> None:
+        # Pages are filled shelf by shelf, a new page is added when one is full
+        self.page_size = page_size
+        self.padding = padding
+        self.pages: List[pygame.Surface] = []
+        self.shelf_x = 0
+        self.shelf_y = 0
+        self.shelf_height = 0
+
+        # Lookup table of page indexes and sub-rects
+        self.rects: Dict[Hashable, Tuple[int, pygame.Rect]] = {}
+        self.surfaces: Dict[Hashable, pygame.Surface] = {}
+        self.used_area = 0
+        self.lock = threading.RLock()
+
+    def add_page(self) -> None:
+        page = pygame.Surface(self.page_size, pygame.SRCALPHA, 32)
+        if pygame.display.get_surface() is not None:
+            page = page.convert_alpha()
+        page.fill((0, 0, 0, 0))
+
+        self.pages.append(page)
+        self.shelf_x = self.shelf_y = self.shelf_height = 0
+
+    def allocate(self, size: Tuple[int, int]) -> Tuple[int, pygame.Rect]:
+        width, height = size
+        page_width, page_height = self.page_size
+        assert width <= page_width and height <= page_height, "Surface is larger than an atlas page."
+
+        # Next shelf if the current one is full, next page if there is no space for a shelf
+        if not self.pages or self.shelf_x + width > page_width:
+            self.shelf_x = 0
+            self.shelf_y += self.shelf_height
+            self.shelf_height = 0
+        if not self.pages or self.shelf_y + height > page_height:
+            self.add_page()
+
+        rect = pygame.Rect(self.shelf_x, self.shelf_y, width, height)
+        self.shelf_x += width + self.padding
+        self.shelf_height = max(self.shelf_height, height + self.padding)
+
+        return len(self.pages) - 1, rect
+
+    def add(self, key: Hashable, surface: pygame.Surface) -> pygame.Surface:
+        # Returned subsurface shares pixels with the page
+        with self.lock:
+            if key in self.surfaces:
+                return self.surfaces[key]
+
+            page_index, rect = self.allocate(surface.get_size())
+            page = self.pages[page_index]
+
+            # Pages keep premultiplied colors, so entries are converted once here and not on every draw,
+            # the copy drops row padding of e.g. rendered text, premul_alpha ignores it
+            if surface.get_flags() & pygame.SRCALPHA:
+                surface = surface.copy().premul_alpha()
+
+            # Maximum with a transparent page copies pixels and alpha unchanged
+            page.blit(surface, rect, special_flags=pygame.BLEND_RGBA_MAX)
+
+            self.rects[key] = (page_index, rect)
+            self.surfaces[key] = page.subsurface(rect)
+            self.used_area += rect.width * rect.height
+
+            return self.surfaces[key]
+
+    def get(self, key: Hashable) -> pygame.Surface:
+        return self.surfaces.get(key)
+
+    def glyph(self,
+              font_path: str,
+              size: int,
+              text: str,
+              color: Tuple[int, int, int]) -> Hashable:
+        key = ("glyph", font_path, size, text, tuple(color))
+        if key not in self.surfaces:
+            font = font_pool.get(font_path, size)
+            self.add(key, font.render(text, True, color))
+
+        return key
+
+    def blits(self,
+              screen: pygame.Surface,
+              items: Sequence[Tuple[Hashable, Union[pygame.Rect, Tuple[float, float]]]]) -> List[pygame.Rect]:
+        # All items are drawn with one call from the atlas pages
+        blit_sequence = []
+        for key, dest in items:
+            page_index, rect = self.rects[key]
+            blit_sequence.append((self.pages[page_index], dest, rect,
+                                  pygame.BLEND_PREMULTIPLIED))
+
+        return screen.blits(blit_sequence)
+
+    def blit(self,
+             screen: pygame.Surface,
+             key: Hashable,
+             dest: Union[pygame.Rect, Tuple[float, float]]) -> pygame.Rect:
+        page_index, rect = self.rects[key]
+        return screen.blit(self.pages[page_index], dest, rect,
+                           special_flags=pygame.BLEND_PREMULTIPLIED)
+
+    def memory_bytes(self) -> int:
+        return sum(page.get_bytesize() * page.get_width() * page.get_height()
+                   for page in self.pages)
+
+    def report(self) -> str:
+        page_area = len(self.pages) * self.page_size[0] * self.page_size[1]
+        used = self.used_area / page_area if page_area > 0 else 0
+
+        return (f"{len(self.surfaces)} textures on {len(self.pages)} pages, "
+                f"{self.memory_bytes() / 1024:.0f} KiB, {used:.0%} used")
+
+
+# Atlas shared by every component in the process
+atlas = TextureAtlas()
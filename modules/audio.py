@@ -0,0 +1,101 @@
+from typing import Optional, Tuple, Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import threading
+
+from pygame import mixer
+
+
+class AudioManager:
+    def __init__(self,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 crossfade_ms: int = 2000,
+                 channels: Tuple[int, int] = (2, 3)) -> None:
+        # Decoded tracks, least recently used first
+        self.tracks: OrderedDict[str, mixer.Sound] = OrderedDict()
+        self.track_bytes = 0
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        # Tracks are decoded one by one in a background thread
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="audio")
+        self.futures: Dict[str, Future] = {}
+
+        # Two channels take turns, the new track fades in while the old one fades out
+        self.crossfade_ms = crossfade_ms
+        self.music_channels = [mixer.Channel(i) for i in channels]
+        self.channel_index = 0
+        self.playing_path: Optional[str] = None
+
+    @staticmethod
+    def get_sound_bytes(sound: mixer.Sound) -> int:
+        frequency, size, channels = mixer.get_init()
+        return int(sound.get_length() * frequency) * channels * abs(size) // 8
+
+    def decode(self, path: str) -> mixer.Sound:
+        sound = mixer.Sound(path)
+
+        with self.lock:
+            self.tracks[path] = sound
+            self.track_bytes += self.get_sound_bytes(sound)
+            self.evict(keep=path)
+
+        return sound
+
+    def evict(self, keep: str) -> None:
+        # The playing and the new track always stay decoded
+        for path in list(self.tracks):
+            if self.track_bytes <= self.max_bytes:
+                break
+            if path in (keep, self.playing_path):
+                continue
+
+            sound = self.tracks.pop(path)
+            self.track_bytes -= self.get_sound_bytes(sound)
+            self.futures.pop(path, None)
+
+    def prefetch(self, path: str) -> Future:
+        with self.lock:
+            if path not in self.futures:
+                self.futures[path] = self.executor.submit(self.decode, path)
+
+            return self.futures[path]
+
+    def play_music(self, path: str, volume: float = 0.4) -> bool:
+        # Switches only to a decoded track, returns False while it is being decoded
+        future = self.prefetch(path)
+        if not future.done():
+            return False
+
+        if future.exception() is not None:
+            print(f"Music was not decoded: {future.exception()}")
+            with self.lock:
+                self.futures.pop(path, None)
+            return True
+
+        if path == self.playing_path:
+            return True
+
+        with self.lock:
+            sound = self.tracks.get(path)
+            if sound is None:
+                # Evicted after decoding, decode it again
+                self.futures.pop(path, None)
+                return False
+            self.tracks.move_to_end(path)
+
+        old_channel = self.music_channels[self.channel_index]
+        self.channel_index = (self.channel_index + 1) % len(self.music_channels)
+        new_channel = self.music_channels[self.channel_index]
+
+        new_channel.set_volume(volume)
+        new_channel.play(sound, loops=-1, fade_ms=self.crossfade_ms)
+        old_channel.fadeout(self.crossfade_ms)
+        self.playing_path = path
+
+        return True
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
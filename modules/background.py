@@ -1,20 +1,34 @@
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Hashable, Sequence
 
 import os
 import random
+import threading
+import importlib.util
 
 import pygame
 
+from .fonts import font_pool
+from .assets import AssetManager
+from .atlas import atlas
+from .layers import Layer
+
+# Backend of pygame.surfarray, imported by it on the first tint
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
 
 class GiftLegend:
     def __init__(self,
                  screen_size: Tuple[int, int],
                  source_dir: str,
+                 assets: AssetManager,
                  font_name: str = "Rubik-Medium.ttf") -> None:
+        # Shared images
+        self.assets = assets
+
         # Paths
         self.font_dir = os.path.join(source_dir, "fonts")
         self.gifts_dir = os.path.join(source_dir, "gifts")
-        self.gifts_listdir = os.listdir(self.gifts_dir)
+        self.gifts_listdir = sorted(os.listdir(self.gifts_dir))
 
         self.width, self.height = screen_size
 
@@ -24,6 +38,13 @@ class GiftLegend:
         self.load_images()
         self.calculate_legend_positions()
 
+        # Legend is pre-rendered to a layer once
+        self.layer = Layer(self.rect.unionall(
+            [rect for item in self.legend_positions for rect in item]))
+
+        # Legend is static, it changes the screen only on the first frame
+        self.drawn = False
+
     def setup_rect(self) -> None:
         self.width_margin = 0
         self.height_margin = 0.875
@@ -46,8 +67,8 @@ class GiftLegend:
     def setup_font(self, font_name: str) -> None:
         self.letter_size = 40
         self.letter_color = (255, 255, 255)
-        font_path = os.path.join(self.font_dir, font_name)
-        self.font = pygame.font.Font(font_path, self.letter_size)
+        self.font_path = os.path.join(self.font_dir, font_name)
+        self.font = font_pool.get(self.font_path, self.letter_size)
 
     def setup_legend(self) -> None:
         self.letters = ['A', 'B', 'C', 'D']
@@ -58,11 +79,10 @@ class GiftLegend:
         self.images_dict = {}
         for letter, image_name in zip(self.letters, self.gifts_listdir):
             image_path = os.path.join(self.gifts_dir, image_name)
-            image = pygame.image.load(image_path)
             scaled_height = int(self.rect.height * 0.9)
-            scaled_image = pygame.transform.scale(
-                image, (scaled_height, scaled_height))
-            self.images_dict[letter] = scaled_image
+            size = (scaled_height, scaled_height)
+            self.images_dict[letter] = atlas.add(("gift", image_path, size),
+                                                 self.assets.image(image_path, size))
 
     def calculate_legend_positions(self) -> None:
         total_items_width = sum(
@@ -73,11 +93,13 @@ class GiftLegend:
         margin = total_margin / (len(self.letters) + 1)
 
         self.legend_positions = []
+        self.legend_items = []
         x = self.rect.left + margin
 
-        for letter in self.letters:
-            letter_surface = self.font.render(letter, True, self.letter_color)
-            letter_rect = letter_surface.get_rect(
+        for letter, image_name in zip(self.letters, self.gifts_listdir):
+            letter_key = atlas.glyph(self.font_path, self.letter_size,
+                                     letter, self.letter_color)
+            letter_rect = atlas.get(letter_key).get_rect(
                 midleft=(x, self.rect.centery))
 
             x += letter_rect.width
@@ -87,15 +109,28 @@ class GiftLegend:
 
             self.legend_positions.append((letter_rect, image_rect))
 
+            # Letters and gifts are drawn from the atlas in one batch
+            image_path = os.path.join(self.gifts_dir, image_name)
+            image_key = ("gift", image_path, image.get_size())
+            self.legend_items += [(letter_key, letter_rect), (image_key, image_rect)]
+
             x += image_rect.width + margin
 
-    def render(self, screen: pygame.Surface) -> None:
-        screen.blit(self.rect_surface, self.rect.topleft)
+    def draw_layer(self) -> None:
+        self.layer.clear()
+        self.layer.blit(self.rect_surface, self.rect.topleft)
+        self.layer.blits(self.legend_items)
+
+    def render(self, screen: pygame.Surface) -> List[pygame.Rect]:
+        if not self.layer.is_valid():
+            self.draw_layer()
+        self.layer.render(screen)
+
+        if self.drawn is True:
+            return []
 
-        for letter, (letter_rect, image_rect) in zip(self.letters, self.legend_positions):
-            letter_surface = self.font.render(letter, True, self.letter_color)
-            screen.blit(letter_surface, letter_rect)
-            screen.blit(self.images_dict[letter], image_rect)
+        self.drawn = True
+        return [self.rect.copy()]
 
 
 class Mention:
@@ -115,12 +150,15 @@ class Mention:
         self.color = color
 
         # Create font
-        self.font = pygame.font.Font(
+        self.font = font_pool.get(
             os.path.join(font_dir, font_name), font_size)
 
         # Setup surface
         self.setup_surface(position=position)
 
+        # Text is static, it changes the screen only on the first frame
+        self.drawn = False
+
     def setup_surface(self, position: str) -> None:
         assert position in [
             'vertical', 'horizontal'], "Position must be one of ['vertical', 'horizontal']."
@@ -138,20 +176,118 @@ class Mention:
             self.rect = self.surface.get_rect(
                 center=(self.width * 0.95, self.height * 0.87))
 
-    def render(self, screen: pygame.Surface) -> None:
+    def render(self, screen: pygame.Surface) -> List[pygame.Rect]:
         screen.blit(self.surface, self.rect)
 
+        if self.drawn is True:
+            return []
+
+        self.drawn = True
+        return [self.rect.copy()]
+
+
+class IconTinter:
+    def __init__(self,
+                 icons_dir: str,
+                 size: int,
+                 assets: AssetManager) -> None:
+        # Paths
+        self.icons_dir = icons_dir
+        self.assets = assets
+        self.icons_listdir = sorted(os.listdir(icons_dir))
+
+        # Size of the icons
+        self.size = size
+
+        # Background preloading, icons are tinted off the main thread into plain
+        # surfaces, only the main thread converts them and packs them into the atlas
+        self.preload_thread = None
+        self.tinted: Dict[Hashable, pygame.Surface] = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, icon_name: str, color: Tuple[int, int, int]) -> Hashable:
+        return ("icon", os.path.join(self.icons_dir, icon_name), tuple(color), self.size)
+
+    def load_icon(self, icon_name: str) -> pygame.Surface:
+        return self.assets.image(os.path.join(self.icons_dir, icon_name),
+                                 (self.size, self.size))
+
+    def get(self,
+            icon_name: str,
+            color: Tuple[int, int, int]) -> pygame.Surface:
+        # Tinted icons are shared by every background in the process
+        key = self.get_key(icon_name, color)
+
+        image = atlas.get(key)
+        if image is None:
+            with self.lock:
+                tinted = self.tinted.pop(key, None)
+            if tinted is None:
+                tinted = self.tint(self.load_icon(icon_name), color)
+            image = atlas.add(key, tinted)
+
+        return image
+
+    def tint_all(self, colors: Sequence[Tuple[int, int, int]]) -> None:
+        for icon_name in self.icons_listdir:
+            # Read from the disk cache, shared converted images stay on the main thread
+            icon = self.assets.read_image(os.path.join(self.icons_dir, icon_name),
+                                          (self.size, self.size))
+            for color in colors:
+                tinted = self.tint(icon, color)
+                with self.lock:
+                    self.tinted[self.get_key(icon_name, color)] = tinted
+
+    def preload(self,
+                colors: Sequence[Tuple[int, int, int]],
+                background: bool = True) -> None:
+        if background is False:
+            for icon_name in self.icons_listdir:
+                for color in colors:
+                    self.get(icon_name, color)
+            return
+
+        self.preload_thread = threading.Thread(target=self.tint_all, args=(colors,),
+                                               daemon=True)
+        self.preload_thread.start()
+
+    @staticmethod
+    def tint(image: pygame.Surface,
+             color: Tuple[int, int, int]) -> pygame.Surface:
+        # Fill the icon with the color while keeping its alpha channel
+        new_image = pygame.Surface(image.get_size(), pygame.SRCALPHA, 32)
+        new_image.fill(color)
+
+        if HAS_NUMPY:
+            alpha = pygame.surfarray.pixels_alpha(new_image)
+            alpha[:] = pygame.surfarray.array_alpha(image)
+            del alpha  # Unlock the surface
+        else:
+            # Same result with blend fills, used if numpy is not installed
+            new_image = image.copy()
+            new_image.fill((0, 0, 0, 255), special_flags=pygame.BLEND_RGBA_MULT)
+            new_image.fill((*color, 0), special_flags=pygame.BLEND_RGBA_ADD)
+
+        return new_image
+
 
 class Background:
     def __init__(self,
                  source_dir: str,
                  screen_size: Tuple[int, int],
+                 assets: AssetManager,
                  shape_size: int = 50,
-                 padding: int = 20) -> None:
+                 padding: int = 20,
+                 rows: int = 5,
+                 columns: int = 4,
+                 speed: float = 1,
+                 scroll_mode: str = "strip",
+                 preload: bool = True) -> None:
+        assert scroll_mode in [
+            "strip", "shapes"], "Scroll mode must be one of ['strip', 'shapes']."
 
         # Paths
         self.icons_dir = os.path.join(source_dir, 'icons')
-        self.icons_listdir = os.listdir(self.icons_dir)
 
         # Screen
         self.screen_width, self.screen_height = screen_size
@@ -162,23 +298,52 @@ class Background:
                        (255, 0, 110), (131, 56, 236), (58, 134, 255))
         self.color_index = 0
 
+        # Icons
+        self.tinter = IconTinter(icons_dir=self.icons_dir,
+                                 size=shape_size,
+                                 assets=assets)
+        if preload is True:
+            self.tinter.preload([Shape.increase_brightness(color)
+                                 for color in self.colors])
+
         # Shapes
         self.shapes: List[Shape] = []
         self.shape_size = shape_size
         self.padding = padding
-        self.create_shapes()
+        self.speed = speed
+        self.icon_name = None
+        self.create_shapes(even_rows=rows, columns=columns)
 
-    def load_image(self) -> pygame.Surface:
-        image = pygame.image.load(os.path.join(
-            self.icons_dir, random.choice(self.icons_listdir))).convert_alpha()
-        image = pygame.transform.scale(
-            image, (self.shape_size, self.shape_size))
+        # Scrolling strip, shapes wrap from x > width back to -size
+        self.scroll_mode = scroll_mode
+        self.strip_width = self.screen_width + self.shape_size + 1
+        self.offset = 0
+        self.__strip = None
+        self.strip_key = None
 
-        return image
+        # Strip position and colors of the last frame
+        self.last_frame_key = None
+
+    @property
+    def color(self) -> Tuple[int, int, int]:
+        return self.colors[self.color_index % len(self.colors)]
+
+    @property
+    def strip(self) -> pygame.Surface:
+        strip_key = (self.color, self.icon_name)
+        if self.__strip is None or self.strip_key != strip_key:
+            self.__strip = self.create_strip()
+            self.strip_key = strip_key
+
+        return self.__strip
+
+    def load_image(self) -> pygame.Surface:
+        self.icon_name = random.choice(self.tinter.icons_listdir)
+        return self.tinter.get(self.icon_name, Shape.increase_brightness(self.color))
 
     def create_shapes(self, even_rows: int = 5, columns: int = 4) -> None:
 
-        # Load icon for shape and preprocess it
+        # Load tinted icon shared by all shapes
         shape_image = self.load_image()
 
         # Find available space and interval
@@ -200,14 +365,54 @@ class Background:
                 # Create shapes
                 shape = Shape(x=x,
                               y=y,
-                              base_image=shape_image,
-                              base_color=self.colors[self.color_index % len(
-                                  self.colors)],
-                              size=self.shape_size)
+                              image=shape_image,
+                              size=self.shape_size,
+                              speed=self.speed)
                 self.shapes.append(shape)
 
-    def render(self, screen: pygame.Surface) -> None:
-        self.surface.fill(self.colors[self.color_index % len(self.colors)])
+    def create_strip(self) -> pygame.Surface:
+        strip = pygame.Surface((self.strip_width, self.screen_height))
+        strip.fill(self.color)
+
+        # Draw shapes at their start positions, wrapping around the strip edge,
+        # tinted icons come premultiplied from the atlas
+        blit_sequence = []
+        for shape in self.shapes:
+            x = (shape.x + self.shape_size) % self.strip_width
+            blit_sequence.append((shape.image, (x, shape.y), None, pygame.BLEND_PREMULTIPLIED))
+            if x + self.shape_size > self.strip_width:
+                blit_sequence.append((shape.image, (x - self.strip_width, shape.y), None,
+                                      pygame.BLEND_PREMULTIPLIED))
+        strip.blits(blit_sequence, doreturn=False)
+
+        return strip
+
+    def render_strip(self, screen: pygame.Surface) -> List[pygame.Rect]:
+        self.offset = (self.offset + self.speed) % self.strip_width
+        start = int(self.shape_size - self.offset) % self.strip_width
+        strip = self.strip
+
+        # Show the strip with at most two blits
+        first_width = min(self.screen_width, self.strip_width - start)
+        screen.blit(strip, (0, 0),
+                    area=pygame.Rect(start, 0, first_width, self.screen_height))
+        if first_width < self.screen_width:
+            screen.blit(strip, (first_width, 0),
+                        area=pygame.Rect(0, 0, self.screen_width - first_width, self.screen_height))
+
+        # Whole screen changes only if the strip has moved by a pixel or was recolored
+        frame_key = (start, self.strip_key)
+        if frame_key == self.last_frame_key:
+            return []
+
+        self.last_frame_key = frame_key
+        return [screen.get_rect()]
+
+    def render(self, screen: pygame.Surface) -> List[pygame.Rect]:
+        if self.scroll_mode == "strip":
+            return self.render_strip(screen)
+
+        self.surface.fill(self.color)
 
         for shape in self.shapes:
             shape.move(self.screen_width)
@@ -215,13 +420,14 @@ class Background:
 
         screen.blit(self.surface, (0, 0))
 
+        return [screen.get_rect()]
+
     def update_color(self) -> None:
         self.color_index += 1
 
         shape_image = self.load_image()
 
         for shape in self.shapes:
-            shape.color = self.colors[self.color_index % len(self.colors)]
             shape.image = shape_image
 
 
@@ -229,8 +435,7 @@ class Shape:
     def __init__(self,
                  x: int,
                  y: int,
-                 base_image: pygame.Surface,
-                 base_color: Tuple[int, int, int],
+                 image: pygame.Surface,
                  size: int,
                  speed: float = 1) -> None:
 
@@ -238,66 +443,13 @@ class Shape:
         self.x = x
         self.y = y
 
-        # Image icon
-        self.base_image = base_image
-        self.__image = None
-
-        # Color
-        self.base_color = base_color
-        self.__color = None
+        # Tinted image icon, shared between shapes
+        self.image = image
 
         # Size and speed
         self.size = size
         self.speed = speed
 
-    @ property
-    def color(self) -> Tuple[int, int, int]:
-        if self.__color is None:
-            self.__color = self.increase_brightness(self.base_color)
-
-        return self.__color
-
-    @ color.setter
-    def color(self, value: Tuple[int, int, int]) -> None:
-        self.__color = self.increase_brightness(value)
-
-    @ property
-    def image(self):
-        if self.__image is None:
-            self.__image = self.update_image_color(self.base_image, self.color)
-
-        return self.__image
-
-    @ image.setter
-    def image(self, value) -> None:
-        self.__image = self.update_image_color(value, self.color)
-
-    @ staticmethod
-    def update_image_color(image: pygame.Surface,
-                           color: Tuple[int, int, int]) -> pygame.Surface:
-        # Get the size of the image
-        width, height = image.get_size()
-
-        # Create a new surface with the same size
-        new_image = pygame.Surface((width, height), pygame.SRCALPHA, 32)
-
-        # Get pixel array
-        for x in range(width):
-            for y in range(height):
-                # Get the color of the pixel
-                pixel = image.get_at((x, y))
-
-                # If the pixel is not transparent
-                if pixel.a != 0:
-                    # Change the pixel to the new color while keeping the alpha
-                    new_image.set_at(
-                        (x, y), (*color, pixel.a))
-                else:
-                    # Keep the pixel transparent
-                    new_image.set_at((x, y), pixel)
-
-        return new_image
-
     @ staticmethod
     def increase_brightness(color: Tuple[int, int, int],
                             factor: float = 1.2) -> Tuple[int, int, int]:
@@ -309,4 +461,4 @@ class Shape:
             self.x = -self.size
 
     def draw(self, surface: pygame.Surface) -> None:
-        surface.blit(self.image, (self.x, self.y))
+        surface.blit(self.image, (self.x, self.y), special_flags=pygame.BLEND_PREMULTIPLIED)
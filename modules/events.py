@@ -0,0 +1,137 @@
+from typing import List, NamedTuple, Optional, Sequence
+
+import json
+import time
+import queue
+import random
+import socket
+import threading
+
+
+class GiftEvent(NamedTuple):
+    user: str
+    gift: str
+    count: int
+    timestamp: float
+    # Price of one gift, e.g. TikTok diamonds, it is the default vote weight
+    value: float = 1
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(list(self)).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "GiftEvent":
+        user, gift, count, timestamp, *value = json.loads(data.decode("utf-8"))
+        return cls(user, gift, int(count), float(timestamp), *map(float, value))
+
+
+class GiftEventQueue:
+    def __init__(self) -> None:
+        # Thread safe queue between event sources and the frame loop
+        self.queue = queue.SimpleQueue()
+
+    def put(self, event: GiftEvent) -> None:
+        self.queue.put(event)
+
+    def drain(self, max_events: Optional[int] = None) -> List[GiftEvent]:
+        events = []
+        while max_events is None or len(events) < max_events:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return events
+
+
+class GiftEventServer:
+    def __init__(self,
+                 event_queue: GiftEventQueue,
+                 host: str = "127.0.0.1",
+                 port: int = 5577,
+                 buffer_size: int = 4 * 1024 * 1024) -> None:
+        # Receives events sent by GiftEventSender from another process
+        self.event_queue = event_queue
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.5)
+        self.address = self.socket.getsockname()
+
+        self.running = False
+        self.thread = None
+
+    def start(self) -> None:
+        self.running = True
+        self.thread = threading.Thread(target=self.receive, daemon=True)
+        self.thread.start()
+
+    def receive(self) -> None:
+        while self.running:
+            try:
+                data = self.socket.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            try:
+                self.event_queue.put(GiftEvent.from_bytes(data))
+            except (ValueError, TypeError):
+                print("Broken gift event was skipped.")
+
+    def stop(self) -> None:
+        self.running = False
+        self.socket.close()
+
+
+class GiftEventSender:
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 5577) -> None:
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, event: GiftEvent) -> None:
+        self.socket.sendto(event.to_bytes(), self.address)
+
+    def put(self, event: GiftEvent) -> None:
+        self.send(event)
+
+
+class FakeGiftSource:
+    def __init__(self,
+                 event_queue,
+                 gifts: Sequence[str],
+                 rate: float = 10,
+                 users: int = 100,
+                 max_count: int = 5) -> None:
+        # Local source of random gift events for testing, event_queue
+        # is GiftEventQueue or GiftEventSender
+        self.event_queue = event_queue
+        self.gifts = list(gifts)
+        self.rate = rate
+        self.users = [f"user_{i}" for i in range(users)]
+        self.max_count = max_count
+
+        self.running = False
+        self.thread = None
+
+    def create_event(self) -> GiftEvent:
+        return GiftEvent(user=random.choice(self.users),
+                         gift=random.choice(self.gifts),
+                         count=random.randint(1, self.max_count),
+                         timestamp=time.time())
+
+    def start(self) -> None:
+        self.running = True
+        self.thread = threading.Thread(target=self.generate, daemon=True)
+        self.thread.start()
+
+    def generate(self) -> None:
+        while self.running:
+            self.event_queue.put(self.create_event())
+            time.sleep(random.expovariate(self.rate))
+
+    def stop(self) -> None:
+        self.running = False
@@ -0,0 +1,122 @@
+from typing import Tuple, List, Optional
+from collections import OrderedDict
+
+import threading
+
+import pygame
+
+
+class FontPool:
+    def __init__(self,
+                 max_size: Optional[int] = None) -> None:
+        # Fonts keyed by (path, size), the oldest are evicted if max_size is set
+        self.max_size = max_size
+        self.fonts: OrderedDict[Tuple[str, int], pygame.font.Font] = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, font_path: str, size: int) -> pygame.font.Font:
+        key = (font_path, int(size))
+
+        with self.lock:
+            font = self.fonts.get(key)
+            if font is not None:
+                self.fonts.move_to_end(key)
+                self.hits += 1
+                return font
+
+            # Parse font file only once per (path, size)
+            font = pygame.font.Font(font_path, key[1])
+            self.fonts[key] = font
+            self.misses += 1
+
+            if self.max_size is not None:
+                while len(self.fonts) > self.max_size:
+                    self.fonts.popitem(last=False)
+
+        return font
+
+    def clear(self) -> None:
+        with self.lock:
+            self.fonts.clear()
+
+
+# Shared by all text components of the process
+font_pool = FontPool()
+
+
+class TextFitter:
+    def __init__(self,
+                 font_path: str,
+                 max_size: int = 50,
+                 min_size: int = 1,
+                 pool: FontPool = font_pool) -> None:
+        self.font_path = font_path
+        self.max_size = max_size
+        self.min_size = min_size
+        self.pool = pool
+
+    def wrap(self,
+             font: pygame.font.Font,
+             words: List[str],
+             width: float) -> List[str]:
+        space_width = font.size(' ')[0]
+
+        lines = []
+        line: List[str] = []
+        line_width = 0
+
+        # Break lines using glyph metrics only, nothing is rendered
+        for word in words:
+            word_width = font.size(word)[0]
+            if line and line_width + space_width + word_width > width:
+                lines.append(' '.join(line))
+                line = [word]
+                line_width = word_width
+            else:
+                line_width += word_width + (space_width if line else 0)
+                line.append(word)
+
+        if line:
+            lines.append(' '.join(line))
+
+        return lines
+
+    def does_text_fit(self,
+                      font: pygame.font.Font,
+                      lines: List[str],
+                      width: float,
+                      height: float) -> bool:
+        if len(lines) * font.get_height() > height:
+            return False
+
+        return all(font.size(line)[0] <= width for line in lines)
+
+    def fit(self,
+            text: str,
+            width: float,
+            height: float) -> Tuple[pygame.font.Font, List[str]]:
+        words = text.split()
+
+        # Binary search of the largest font size that fits the box
+        best = None
+        low, high = self.min_size, self.max_size
+        while low <= high:
+            font_size = (low + high) // 2
+            font = self.pool.get(self.font_path, font_size)
+            lines = self.wrap(font, words, width)
+
+            if self.does_text_fit(font, lines, width, height):
+                best = (font, lines)
+                low = font_size + 1
+            else:
+                high = font_size - 1
+
+        if best is None:
+            font = self.pool.get(self.font_path, self.min_size)
+            best = (font, self.wrap(font, words, width))
+
+        return best
@@ -0,0 +1,123 @@
+from typing import Optional, Tuple
+
+import time
+import struct
+from multiprocessing import shared_memory
+
+import pygame
+
+# Buffer header: magic, version, slots, slot size, width, height, pitch, format, latest frame
+HEADER = struct.Struct("<4sIIIIII4sQ")
+HEADER_SIZE = 64
+
+# Slot header: frame number, timestamp, width, height, pitch
+SLOT_HEADER = struct.Struct("<QdIII")
+SLOT_HEADER_SIZE = 32
+
+MAGIC = b"TQFB"
+VERSION = 1
+
+
+def get_pixel_format(surface: pygame.Surface) -> bytes:
+    # Order of channels in memory of a 32 bit surface, e.g. b"BGRA"
+    masks = surface.get_masks()
+    pixel_format = b""
+    for i in range(4):
+        byte_mask = 0xff << (8 * i)
+        channel = b"X"
+        for name, mask in zip((b"R", b"G", b"B", b"A"), masks):
+            if mask == byte_mask:
+                channel = name
+        pixel_format += channel
+
+    return pixel_format
+
+
+class SharedFrameWriter:
+    def __init__(self,
+                 name: str,
+                 surface: pygame.Surface,
+                 slots: int = 3) -> None:
+        assert surface.get_bytesize() == 4, "Only 32 bit surfaces can be published."
+
+        # Frame geometry
+        self.width, self.height = surface.get_size()
+        self.pitch = surface.get_pitch()
+        self.pixel_format = get_pixel_format(surface)
+        self.frame_size = self.pitch * self.height
+
+        # Ring buffer of slots, every slot has its own header
+        self.slots = slots
+        self.slot_size = SLOT_HEADER_SIZE + self.frame_size
+        size = HEADER_SIZE + slots * self.slot_size
+
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buffer = self.memory.buf
+        self.frame_number = 0
+
+        HEADER.pack_into(self.buffer, 0, MAGIC, VERSION, slots, self.slot_size,
+                         self.width, self.height, self.pitch, self.pixel_format, 0)
+
+    def write(self, surface: pygame.Surface) -> None:
+        self.frame_number += 1
+        offset = HEADER_SIZE + (self.frame_number % self.slots) * self.slot_size
+
+        # Frame number 0 marks the slot as being written
+        SLOT_HEADER.pack_into(self.buffer, offset, 0, 0.0, 0, 0, 0)
+
+        # Copy pixels straight from the surface memory
+        view = surface.get_view("1")
+        pixels = memoryview(view).cast("B")
+        start = offset + SLOT_HEADER_SIZE
+        self.buffer[start:start + self.frame_size] = pixels
+        pixels.release()
+        del view
+
+        SLOT_HEADER.pack_into(self.buffer, offset, self.frame_number, time.time(),
+                              self.width, self.height, self.pitch)
+
+        # Latest frame is the last field of the buffer header
+        struct.pack_into("<Q", self.buffer, HEADER.size - 8, self.frame_number)
+
+    def close(self) -> None:
+        self.buffer = None
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedFrameReader:
+    def __init__(self, name: str) -> None:
+        self.memory = shared_memory.SharedMemory(name=name)
+        self.buffer = self.memory.buf
+
+        (magic, version, self.slots, self.slot_size, self.width, self.height,
+         self.pitch, self.pixel_format, _) = HEADER.unpack_from(self.buffer, 0)
+        assert magic == MAGIC and version == VERSION, "Shared memory has no frames."
+
+        self.frame_size = self.pitch * self.height
+
+    def latest_frame_number(self) -> int:
+        return struct.unpack_from("<Q", self.buffer, HEADER.size - 8)[0]
+
+    def read(self, out: Optional[bytearray] = None) -> Optional[Tuple[int, float, bytearray]]:
+        # Copy the latest frame into out, returns None if it was overwritten meanwhile
+        frame_number = self.latest_frame_number()
+        if frame_number == 0:
+            return None
+
+        offset = HEADER_SIZE + (frame_number % self.slots) * self.slot_size
+        if out is None:
+            out = bytearray(self.frame_size)
+
+        start = offset + SLOT_HEADER_SIZE
+        out[:] = self.buffer[start:start + self.frame_size]
+        slot_frame, timestamp, _, _, _ = SLOT_HEADER.unpack_from(self.buffer, offset)
+
+        if slot_frame != frame_number:
+            return None
+
+        return frame_number, timestamp, out
+
+    def close(self) -> None:
+        self.buffer = None
+        self.memory.close()
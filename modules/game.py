@@ -1,12 +1,21 @@
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 
 import pygame
 
-from .quiz import QuizHandler
+from .quiz import QuizHandler, QuizGetter
 from .background import Background, Mention, GiftLegend
 from .progress_bar import ProgressBar
 from .sound import SoundMaker
+from .assets import AssetManager
+from .atlas import atlas
+from .timing import FrameScheduler, LatencyTracker, StartupTimer
+from .events import GiftEvent, GiftEventQueue, GiftEventServer, FakeGiftSource
+from .votes import VoteTally
+from .replay import GiftRecorder
+from .frame_output import SharedFrameWriter
 
 
 class GameCreator:
@@ -14,15 +23,45 @@ class GameCreator:
                  json_dir: str,
                  source_dir: str,
                  screen_size: Tuple[int, int] = (360, 640),
-                 fps: int = 120) -> None:
+                 fps: int = 60,
+                 dirty_rects: bool = False,
+                 stats_interval: float = 60,
+                 synthesizer=None,
+                 gift_port: Optional[int] = None,
+                 fake_gift_rate: float = 0,
+                 gift_weights: Optional[Dict[str, float]] = None,
+                 user_limit: Optional[float] = None,
+                 user_window: Optional[float] = None,
+                 record_path: Optional[str] = None,
+                 headless: bool = False,
+                 frame_output: Optional[str] = None,
+                 state_dir: Optional[str] = None,
+                 stats_callback: Optional[Callable[[Dict[str, float]], None]] = None,
+                 startup_timer: Optional[StartupTimer] = None) -> None:
+        # Startup phases, reported after the first frame
+        self.startup_timer = startup_timer if startup_timer is not None else StartupTimer()
+        self.first_frame = True
+
         # Paths
         self.json_dir = json_dir
         self.source_dir = source_dir
         self.font_dir = os.path.join(source_dir, "fonts")
 
-        # Init font, mixer
-        pygame.font.init()
-        pygame.mixer.init()
+        # Question bank does not need pygame, it is opened while the display starts
+        startup_executor = ThreadPoolExecutor(max_workers=1,
+                                              thread_name_prefix="startup")
+        quiz_getter = startup_executor.submit(self.create_quiz_getter,
+                                              json_dir, state_dir)
+        startup_executor.shutdown(wait=False)
+
+        # Run without display and sound card
+        if headless is True:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+        # Init pygame, pygame.time.get_ticks needs the timer
+        with self.startup_timer.phase("pygame"):
+            pygame.init()
 
         # Game modes
         self.game_modes = ("question", "answer")
@@ -33,41 +72,106 @@ class GameCreator:
 
         # Video
         self.fps = fps
+        self.scheduler = FrameScheduler(fps=fps)
+        self.stats_interval = stats_interval
+        self.stats_callback = stats_callback
+        self.stats_time = 0
+
+        # Update only changed regions of the display, F1 draws them
+        self.dirty_rects = dirty_rects
+        self.debug_dirty = False
+        self.full_update = True
 
         # Display and background
         self.screen_size = screen_size
-        self.setup_display(source_dir)
-        self.background = Background(source_dir=source_dir,
-                                     screen_size=screen_size)
+        with self.startup_timer.phase("display"):
+            self.setup_display(source_dir)
+
+        # Finished frames are published to shared memory for encoders
+        self.frame_writer = None
+        if frame_output is not None:
+            self.frame_writer = SharedFrameWriter(name=frame_output,
+                                                  surface=self.screen)
+
+        # Images and sounds are decoded in parallel before components need them
+        with self.startup_timer.phase("assets"):
+            self.assets = AssetManager(source_dir=source_dir,
+                                       screen_size=screen_size)
+            self.assets.preload()
+
+        with self.startup_timer.phase("background"):
+            self.background = Background(source_dir=source_dir,
+                                         screen_size=screen_size,
+                                         assets=self.assets)
 
         # Text
-        self.mention = Mention(screen_size=screen_size,
-                               font_dir=os.path.join(source_dir, "fonts"),
-                               position="horizontal")
+        with self.startup_timer.phase("overlays"):
+            self.mention = Mention(screen_size=screen_size,
+                                   font_dir=os.path.join(source_dir, "fonts"),
+                                   position="horizontal")
 
-        # Gifts legend
-        self.gift_legend = GiftLegend(screen_size=screen_size,
-                                      source_dir=source_dir)
+            # Gifts legend
+            self.gift_legend = GiftLegend(screen_size=screen_size,
+                                          source_dir=source_dir,
+                                          assets=self.assets)
+
+        # Gift events from TikTok client or fake source
+        self.setup_gift_events(gift_port, fake_gift_rate)
+
+        # Recording of gift events and their latency until they are displayed
+        self.recorder = GiftRecorder(record_path) if record_path is not None else None
+        self.latency_tracker = LatencyTracker()
+        self.frame_event_times: List[float] = []
 
-        # Counts of gifts
-        self.gifts_counter = {k: 0 for k in range(4)}
+        # Votes for answers
+        self.vote_tally = VoteTally(gift_indexes=self.gift_indexes,
+                                    gift_weights=gift_weights,
+                                    user_limit=user_limit,
+                                    user_window=user_window)
 
         # Quiz
-        self.quiz_handler = QuizHandler(json_dir=json_dir,
-                                        font_dir=os.path.join(
-                                            source_dir, "fonts"),
-                                        source_dir=source_dir,
-                                        screen_size=screen_size)
+        with self.startup_timer.phase("quiz"):
+            self.quiz_handler = QuizHandler(json_dir=json_dir,
+                                            font_dir=os.path.join(
+                                                source_dir, "fonts"),
+                                            source_dir=source_dir,
+                                            screen_size=screen_size,
+                                            synthesizer=synthesizer,
+                                            quiz_getter=quiz_getter.result())
 
         # Progress bar
         self.progress_bar = ProgressBar(screen_size=screen_size)
 
         # Sound
-        self.sound_maker = SoundMaker(source_dir=source_dir)
+        with self.startup_timer.phase("sound"):
+            self.sound_maker = SoundMaker(source_dir=source_dir,
+                                          assets=self.assets)
+        self.assets.save_manifest()
 
         # Running
         self.running = True
 
+    def create_quiz_getter(self, json_dir: str, state_dir: Optional[str]) -> QuizGetter:
+        with self.startup_timer.phase("bank"):
+            return QuizGetter(json_dir=json_dir, state_dir=state_dir)
+
+    def setup_gift_events(self, gift_port: Optional[int], fake_gift_rate: float) -> None:
+        self.gift_events = GiftEventQueue()
+        self.gift_indexes = {gift: i for i, gift in enumerate(self.gift_legend.gifts)}
+
+        self.gift_server = None
+        if gift_port is not None:
+            self.gift_server = GiftEventServer(event_queue=self.gift_events,
+                                               port=gift_port)
+            self.gift_server.start()
+
+        self.fake_gift_source = None
+        if fake_gift_rate > 0:
+            self.fake_gift_source = FakeGiftSource(event_queue=self.gift_events,
+                                                   gifts=self.gift_legend.gifts,
+                                                   rate=fake_gift_rate)
+            self.fake_gift_source.start()
+
     def setup_display(self, source_dir: str) -> None:
         self.screen = pygame.display.set_mode(self.screen_size)
         pygame.display.set_caption("LiveQuizMaster")
@@ -103,75 +207,175 @@ class GameCreator:
         self.quiz_handler.update_quiz()
         # Update sounds
         self.sound_maker.update_sounds()
-        # Reset gift counter
-        self.gifts_counter = {k: 0 for k in range(4)}
+        # Reset votes
+        self.vote_tally.reset()
+
+    def parse_gift_events(self) -> None:
+        events = self.gift_events.drain()
+        if self.recorder is not None:
+            self.recorder.record(events)
+
+        self.frame_event_times = [event.timestamp for event in events]
+        self.vote_tally.submit(events)
+
+    def add_key_vote(self, idx: int) -> None:
+        self.vote_tally.submit([GiftEvent(user="keyboard",
+                                          gift=self.gift_legend.gifts[idx],
+                                          count=1,
+                                          timestamp=time.time())])
 
     def parse_events(self) -> None:
+        self.parse_gift_events()
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
 
             # Check for key down events
             if event.type == pygame.KEYDOWN:
+                # Show dirty regions
+                if event.key == pygame.K_F1:
+                    self.debug_dirty = not self.debug_dirty
+                    self.full_update = True
                 # 1 - A
                 if event.key == pygame.K_1:
-                    self.gifts_counter[0] += 1
+                    self.add_key_vote(0)
                 # 2 - B
                 if event.key == pygame.K_2:
-                    self.gifts_counter[1] += 1
+                    self.add_key_vote(1)
                 # 3 - C
                 if event.key == pygame.K_3:
-                    self.gifts_counter[2] += 1
+                    self.add_key_vote(2)
                 # 4 - D
                 if event.key == pygame.K_4:
-                    self.gifts_counter[3] += 1
+                    self.add_key_vote(3)
+
+    def log_stats(self, ticks: int) -> None:
+        if self.stats_interval and (ticks - self.stats_time) / 1000 >= self.stats_interval:
+            # Supervised games report to their supervisor instead of printing
+            if self.stats_callback is not None:
+                self.stats_callback(self.scheduler.stats())
+            else:
+                print(f"Frame stats: {self.scheduler.report()}")
+            self.stats_time = ticks
+
+    def update_display(self, dirty_rects: List[pygame.Rect]) -> None:
+        if self.dirty_rects is False or self.full_update is True:
+            pygame.display.flip()
+            self.full_update = False
+            return
 
-    def run(self) -> None:
-        # Initialize start time
-        self.mode_start_time = pygame.time.get_ticks()
-        while self.running:
-            self.parse_events()
+        if self.debug_dirty is True:
+            for rect in dirty_rects:
+                pygame.draw.rect(self.screen, (255, 0, 255), rect, width=1)
 
-            # Render background
-            self.background.render(self.screen)
+        pygame.display.update(dirty_rects)
 
-            # Mention
-            self.mention.render(self.screen)
+    def start(self) -> None:
+        # Initialize start time
+        self.mode_start_time = pygame.time.get_ticks()
+        self.stats_time = self.mode_start_time
+        self.scheduler.start()
 
-            # Gifts legend
-            self.gift_legend.render(self.screen)
+    def run(self) -> None:
+        self.start()
+        while self.running:
+            ticks = self.render_frame()
 
-            # Render quiz
-            self.quiz_handler.render(self.screen, self.gifts_counter)
+            # FPS
+            self.scheduler.tick()
+            self.log_stats(ticks)
 
-            # Get ticks
-            ticks = pygame.time.get_ticks()
+        self.close()
 
-            # Check game mode
-            elapsed_time = self.check_game_mode(ticks)
+    async def run_async(self) -> None:
+        # Frame loop as a coroutine, gift clients and voices share its event loop
+        self.start()
+        while self.running:
+            ticks = self.render_frame()
 
-            # Render progress bar
-            if self.current_mode == "question":
-                self.progress_bar.render(
-                    self.screen, elapsed_time, self.mode_durations[self.mode_index])
+            # FPS, other tasks run until the next frame
+            await self.scheduler.tick_async()
+            self.log_stats(ticks)
 
-            # Show and sound answer
-            if self.current_mode == "answer":
-                self.quiz_handler.show_answer(self.screen)
-                self.sound_maker.make_effect(effect_type="answer")
+        self.close()
 
-            # Play ticking
-            if self.is_run_out_question_time(elapsed_time):
-                self.sound_maker.make_effect(effect_type="tick")
+    def render_frame(self) -> int:
+        self.parse_events()
 
-            # Play music
-            self.sound_maker.play_music()
+        # Render background
+        dirty_rects = self.background.render(self.screen)
 
-            # Flip display
-            pygame.display.flip()
+        # Mention
+        dirty_rects += self.mention.render(self.screen)
 
-            # FPS
-            pygame.time.Clock().tick(self.fps)
+        # Gifts legend
+        dirty_rects += self.gift_legend.render(self.screen)
+
+        # Count votes once per frame
+        self.vote_tally.update()
+
+        # Render quiz
+        dirty_rects += self.quiz_handler.render(self.screen,
+                                                self.vote_tally)
+
+        # Get ticks
+        ticks = pygame.time.get_ticks()
+
+        # Check game mode, its change redraws the whole screen
+        mode_index = self.mode_index
+        elapsed_time = self.check_game_mode(ticks)
+        if mode_index != self.mode_index:
+            self.full_update = True
+
+        # Render progress bar
+        if self.current_mode == "question":
+            dirty_rects += self.progress_bar.render(
+                self.screen, elapsed_time, self.mode_durations[self.mode_index])
+
+        # Show and sound answer
+        if self.current_mode == "answer":
+            dirty_rects += self.quiz_handler.show_answer(self.screen)
+            self.sound_maker.make_effect(effect_type="answer")
+
+        # Play ticking
+        if self.is_run_out_question_time(elapsed_time):
+            self.sound_maker.make_effect(effect_type="tick")
+
+        # Play music
+        self.sound_maker.play_music()
+
+        # Update display
+        self.update_display(dirty_rects)
+        if self.first_frame is True:
+            self.startup_timer.mark("first frame")
+            print(self.startup_timer.report())
+            self.first_frame = False
+        if self.frame_writer is not None:
+            self.frame_writer.write(self.screen)
+        self.latency_tracker.add(time.time(), self.frame_event_times)
+
+        return ticks
+
+    def close(self) -> None:
+        # Stop gift events
+        if self.gift_server is not None:
+            self.gift_server.stop()
+        if self.fake_gift_source is not None:
+            self.fake_gift_source.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.frame_writer is not None:
+            self.frame_writer.close()
+        self.assets.save_manifest()
+        self.sound_maker.audio.close()
+        self.quiz_handler.voice_maker.close()
 
         # Quit Pygame
+        if self.stats_callback is not None:
+            self.stats_callback(self.scheduler.stats())
+        print(f"Frame stats: {self.scheduler.report()}")
+        if self.latency_tracker.count > 0:
+            print(f"Gift stats: {self.latency_tracker.report()}")
+        print(f"Atlas: {atlas.report()}")
         pygame.quit()
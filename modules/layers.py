@@ -0,0 +1,54 @@
+from typing import Tuple, Union, Hashable, Optional, Sequence
+
+import pygame
+
+from .atlas import atlas
+
+
+class Layer:
+    def __init__(self, rect: pygame.Rect) -> None:
+        # Pre-rendered part of the screen, redrawn only when its key changes
+        self.rect = pygame.Rect(rect)
+        self.surface = pygame.Surface(self.rect.size, pygame.SRCALPHA, 32)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()
+
+        self.key: Optional[Hashable] = None
+        self.valid = False
+
+    def is_valid(self, key: Hashable = None) -> bool:
+        return self.valid is True and self.key == key
+
+    def clear(self, key: Hashable = None) -> None:
+        self.surface.fill((0, 0, 0, 0))
+        self.key = key
+        self.valid = True
+
+    def local(self,
+              position: Union[pygame.Rect, Tuple[float, float]]) -> Union[pygame.Rect, Tuple[float, float]]:
+        # Screen coordinates to coordinates on the layer
+        if isinstance(position, pygame.Rect):
+            return position.move(-self.rect.x, -self.rect.y)
+
+        return (position[0] - self.rect.x, position[1] - self.rect.y)
+
+    def blit(self,
+             source: pygame.Surface,
+             dest: Union[pygame.Rect, Tuple[float, float]],
+             area: Optional[pygame.Rect] = None) -> None:
+        # premul_alpha ignores the pitch of subsurfaces
+        if source.get_parent() is not None:
+            source = source.copy()
+
+        # Layer keeps premultiplied colors, so translucent sources stack the same way as on the screen
+        self.surface.blit(source.premul_alpha(), self.local(dest), area,
+                          special_flags=pygame.BLEND_PREMULTIPLIED)
+
+    def blits(self,
+              items: Sequence[Tuple[Hashable, Union[pygame.Rect, Tuple[float, float]]]]) -> None:
+        # Atlas pages are premultiplied already, items are drawn with one call
+        atlas.blits(self.surface, [(key, self.local(dest)) for key, dest in items])
+
+    def render(self, screen: pygame.Surface) -> pygame.Rect:
+        return screen.blit(self.surface, self.rect,
+                           special_flags=pygame.BLEND_PREMULTIPLIED)
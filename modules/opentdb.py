@@ -1,103 +1,216 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 import os
 import json
 import time
+import threading
 
 import requests
-import html
+from requests.adapters import HTTPAdapter
 
+from .question_bank import QuestionBank, QuestionIngestor
 
-class OpentdbAPIHandler:
-    def __init__(self,
-                 json_dir: str) -> None:
-        self.json_dir: str = json_dir
-
-        # Index
-        self.index: int = 0
-
-    def download_questions(self, q_type: str, amount: int = 50) -> None:
-        # Get token
-        response_token = requests.get(
-            "https://opentdb.com/api_token.php?command=request")
-        session_token = response_token.json()["token"]
-
-        # API endpoint
-        url = f"https://opentdb.com/api.php?amount={
-            amount}&type={q_type}&token={session_token}"
 
-        # Initialize an empty list to store the questions
-        questions: List[int] = []
-
-        # Retrieve questions in batches of amount
+class TokenBucket:
+    def __init__(self,
+                 rate: float,
+                 capacity: int = 1) -> None:
+        # Requests per second and burst size
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_time = time.monotonic()
+
+        # Time until which requests are paused after the rate limit is hit
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
         while True:
-            # Make the API request
-            response = requests.get(url)
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last_time) * self.rate)
+                self.last_time = now
 
-            # Check if the request was successful
-            if response.status_code == 200:
-                # Load the JSON data
-                data = json.loads(response.text)
+                if self.tokens >= 1 and now >= self.paused_until:
+                    self.tokens -= 1
+                    return
 
-                # Check if the API request was successful
-                if data['response_code'] == 0:
+                wait_time = max(self.paused_until - now,
+                                (1 - self.tokens) / self.rate)
 
-                    # Edit data
-                    data = self.edit_data(data=data)
+            time.sleep(wait_time)
 
-                    # Add the questions to the list
-                    questions.extend(data['results'])
-                    print(f"It was downloaded {len(questions)} questions.")
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + seconds)
+            self.tokens = 0
 
-                    # Check if there are more questions to retrieve
-                    if len(data['results']) < amount:
-                        break
 
-                    # Delay for 5 seconds to avoid exceeding the rate limit
-                    time.sleep(5)
+class OpentdbAPIHandler:
+    def __init__(self,
+                 json_dir: str,
+                 base_url: str = "https://opentdb.com",
+                 rate: float = 0.2,
+                 workers: int = 4,
+                 timeout: float = 30,
+                 db_name: str = "questions.db") -> None:
+        self.json_dir: str = json_dir
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        # Pooled session shared by workers
+        self.workers = workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # API allows one request per 5 seconds
+        self.bucket = TokenBucket(rate=rate)
+        self.rate_limit_pause = 5
+
+        # Checkpoint with token and progress of every (type, category) job
+        self.checkpoint_path = os.path.join(json_dir, "opentdb_checkpoint.json")
+        self.checkpoint: Dict = {"token": None, "jobs": {}}
+        self.lock = threading.Lock()
+
+        # Batches are normalized, deduplicated and stored as they arrive
+        self.question_bank = QuestionBank(
+            db_path=os.path.join(json_dir, db_name))
+        self.ingestor = QuestionIngestor(question_bank=self.question_bank)
+
+    def request_json(self, path: str, params: Optional[Dict] = None) -> Dict:
+        self.bucket.acquire()
+        response = self.session.get(self.base_url + path,
+                                    params=params,
+                                    timeout=self.timeout)
+        response.raise_for_status()
+
+        return response.json()
+
+    def request_token(self) -> str:
+        data = self.request_json("/api_token.php", {"command": "request"})
+        return data["token"]
+
+    def get_categories(self) -> List[int]:
+        data = self.request_json("/api_category.php")
+        return [category["id"] for category in data["trivia_categories"]]
+
+    def load_checkpoint(self) -> None:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as file:
+                self.checkpoint = json.load(file)
+
+    def save_checkpoint(self) -> None:
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.checkpoint, file, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def save_batch(self, job_key: str, questions: List[Dict], done: bool) -> int:
+        # Store batch and mark progress, so a restart continues from here
+        inserted, _ = self.ingestor.ingest(questions)
+
+        with self.lock:
+            job = self.checkpoint["jobs"].setdefault(
+                job_key, {"downloaded": 0, "done": False})
+            job["downloaded"] += len(questions)
+            job["done"] = done
+            self.save_checkpoint()
+
+        return inserted
+
+    def refresh_token(self, old_token: str) -> str:
+        with self.lock:
+            # Other worker could have refreshed it already
+            if self.checkpoint["token"] == old_token:
+                self.checkpoint["token"] = self.request_token()
+                self.save_checkpoint()
+
+            return self.checkpoint["token"]
+
+    def download_job(self, q_type: str, category: int, amount: int) -> int:
+        job_key = f"{q_type}:{category}"
+        downloaded = 0
 
-                # Token Empty Session Token has returned all possible questions
-                elif data["response_code"] == 4:
-                    time.sleep(60)
-                    break
+        while True:
+            token = self.checkpoint["token"]
+            params = {"amount": amount, "type": q_type,
+                      "category": category, "token": token}
+
+            try:
+                data = self.request_json("/api.php", params)
+            except (requests.RequestException, ValueError) as error:
+                print(f"Error in {job_key}: {error}")
+                return downloaded
+
+            # Success
+            if data["response_code"] == 0:
+                done = len(data["results"]) < amount
+                inserted = self.save_batch(job_key, data["results"], done)
+                downloaded += len(data["results"])
+                print(f"It was downloaded {downloaded} questions of {job_key}, "
+                      f"{len(data['results']) - inserted} of the last batch were duplicates.")
+
+                if done:
+                    return downloaded
+
+            # No Results, there are less than amount questions left
+            elif data["response_code"] == 1:
+                if amount == 1:
+                    self.save_batch(job_key, [], True)
+                    return downloaded
+                amount = max(1, amount // 2)
+
+            # Token Not Found
+            elif data["response_code"] == 3:
+                self.refresh_token(token)
+
+            # Token Empty Session Token has returned all possible questions
+            elif data["response_code"] == 4:
+                self.save_batch(job_key, [], True)
+                return downloaded
+
+            # Rate Limit, all workers wait
+            elif data["response_code"] == 5:
+                print("Rate limit exceeded. Waiting...")
+                self.bucket.pause(self.rate_limit_pause)
 
-                elif data["response_code"] == 5:
-                    print("Rate limit exceeded. Waiting for 10 seconds...")
-                    time.sleep(60)
             else:
-                print(f"Error: {response.status_code}")
-                break
-
-        # Save questions
-        self.save_json(q_type=q_type,
-                       questions=questions)
-
-    def edit_data(self, data: List[Dict[str, str]]) -> List[Dict[str, str]]:
-        # Edit data
-        for i in range(len(data["results"])):
-            # Reformat text of the questions and answers
-            # Question
-            data["results"][i]['question'] = html.unescape(
-                data["results"][i]['question'])
-            # Correct answer
-            data["results"][i]["correct_answer"] = html.unescape(
-                data["results"][i]["correct_answer"])
-            # Incorrect answers
-            for j in range(len(data["results"][i]["incorrect_answers"])):
-                data["results"][i]["incorrect_answers"][j] = html.unescape(
-                    data["results"][i]["incorrect_answers"][j])
-
-            # Add index
-            data["results"][i]['index'] = self.index
-            self.index += 1
-
-        return data
-
-    def save_json(self, q_type: str,  questions: str) -> None:
-        # Save the questions to a JSON file
-        json_path: str = os.path.join(
-            self.json_dir, f"trivia_questions_{q_type}.json")
-        with open(json_path, "w") as file:
-            json.dump(questions, file, indent=2)
-
-        print(f"Questions with {q_type} type was saved.")
+                print(f"Error in {job_key}: response code {data['response_code']}")
+                return downloaded
+
+    def download_questions(self,
+                           q_types: Sequence[str] = ("multiple",),
+                           amount: int = 50,
+                           categories: Optional[Sequence[int]] = None) -> None:
+        # Continue previous download if it was interrupted
+        self.load_checkpoint()
+        if self.checkpoint["token"] is None:
+            self.checkpoint["token"] = self.request_token()
+            self.save_checkpoint()
+
+        if categories is None:
+            categories = self.get_categories()
+
+        jobs: List[Tuple[str, int]] = [
+            (q_type, category) for q_type in q_types for category in categories
+            if not self.checkpoint["jobs"].get(f"{q_type}:{category}", {}).get("done", False)]
+
+        # Download several categories and types concurrently
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.download_job, q_type, category, amount)
+                       for q_type, category in jobs]
+            for future in futures:
+                future.result()
+
+        print(f"{self.ingestor.inserted} new questions were saved, "
+              f"{self.ingestor.duplicates} duplicates were skipped.")
+
+        # Remove checkpoint of the finished download
+        if all(job["done"] for job in self.checkpoint["jobs"].values()):
+            os.remove(self.checkpoint_path)
@@ -1,7 +1,9 @@
-from typing import Tuple
+from typing import Tuple, List
 
 import pygame
 
+from .layers import Layer
+
 
 class ProgressBar:
     def __init__(self,
@@ -27,6 +29,12 @@ class ProgressBar:
         self.__outer_rect = None
         self.__inner_rect = None
 
+        # Outer and inner rects do not change, they are pre-rendered to a layer
+        self.frame = Layer(self.outer_rect)
+
+        # Width and color of the bar on the last frame
+        self.last_bar_key = None
+
     @property
     def outer_rect(self) -> pygame.Rect:
         if self.__outer_rect is None:
@@ -61,7 +69,7 @@ class ProgressBar:
     def draw_bar(self,
                  screen: pygame.Surface,
                  current_time: float,
-                 total_time: float) -> None:
+                 total_time: float) -> List[pygame.Rect]:
         # Progress and color
         progress = round(current_time / total_time, 3)
         color = self.value_to_rgb(progress)
@@ -83,24 +91,40 @@ class ProgressBar:
         screen.blit(progress_surface, (self.inner_rect.left, self.inner_rect.top),
                     area=pygame.Rect(0, 0, rect_width, rect_height))
 
-    def render(self,
-               screen: pygame.Surface,
-               current_time: int,
-               total_time: int) -> None:
+        # Report the bar only if it looks different from the last frame
+        bar_key = (rect_width, color)
+        if bar_key == self.last_bar_key:
+            return []
+
+        self.last_bar_key = bar_key
+        return [self.outer_rect.copy()]
+
+    def draw_frame(self) -> None:
+        self.frame.clear()
+
         # Draw outer rect
-        pygame.draw.rect(screen,
+        pygame.draw.rect(self.frame.surface,
                          self.outer_rect_color,
-                         self.outer_rect,
+                         self.frame.local(self.outer_rect),
                          width=self.outer_rect_width,
                          border_radius=self.rect_border_radius)
 
         # Draw inner rect
-        pygame.draw.rect(screen,
+        pygame.draw.rect(self.frame.surface,
                          self.inner_rect_color,
-                         self.inner_rect,
+                         self.frame.local(self.inner_rect),
                          border_radius=self.rect_border_radius)
 
+    def render(self,
+               screen: pygame.Surface,
+               current_time: int,
+               total_time: int) -> List[pygame.Rect]:
+        # Draw outer and inner rects
+        if not self.frame.is_valid():
+            self.draw_frame()
+        self.frame.render(screen)
+
         # Draw progress bar
-        self.draw_bar(screen,
-                      current_time,
-                      total_time)
+        return self.draw_bar(screen,
+                             current_time,
+                             total_time)
@@ -0,0 +1,223 @@
+from typing import Dict, List, Optional, Iterable, Tuple
+
+import os
+import re
+import json
+import html
+import hashlib
+import sqlite3
+import threading
+
+
+class QuestionBank:
+    def __init__(self,
+                 db_path: str,
+                 read_only: bool = False) -> None:
+        # Paths
+        self.db_path = db_path
+
+        # Connection is shared between threads, access is serialized by the lock
+        if read_only is True:
+            uri = f"file:{db_path}?mode=ro"
+            self.connection = sqlite3.connect(
+                uri, uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(
+                db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+
+        if read_only is False:
+            self.create_tables()
+
+    def create_tables(self) -> None:
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                PRAGMA journal_mode = WAL;
+
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT NOT NULL,
+                    type_index INTEGER NOT NULL,
+                    category TEXT,
+                    difficulty TEXT,
+                    question TEXT NOT NULL,
+                    correct_answer TEXT NOT NULL,
+                    incorrect_answers TEXT NOT NULL,
+                    content_hash TEXT
+                );
+            """)
+
+        # Banks created before deduplication have no content hashes
+        columns = [row["name"] for row in self.connection.execute(
+            "PRAGMA table_info(questions)")]
+        if "content_hash" not in columns:
+            self.add_content_hashes()
+
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE UNIQUE INDEX IF NOT EXISTS questions_content_hash
+                    ON questions (content_hash);
+                CREATE UNIQUE INDEX IF NOT EXISTS questions_type_index
+                    ON questions (type, type_index);
+                CREATE INDEX IF NOT EXISTS questions_category
+                    ON questions (type, category);
+                CREATE INDEX IF NOT EXISTS questions_difficulty
+                    ON questions (type, difficulty);
+            """)
+
+    def add_content_hashes(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "ALTER TABLE questions ADD COLUMN content_hash TEXT")
+
+            rows = self.connection.execute("SELECT * FROM questions").fetchall()
+            for row in rows:
+                content_hash = QuestionIngestor.content_hash(self.row_to_dict(row))
+                self.connection.execute("UPDATE questions SET content_hash = ? WHERE id = ?",
+                                        (content_hash, row["id"]))
+
+            # Remove duplicates and make positions of every type dense again
+            self.connection.executescript("""
+                DELETE FROM questions WHERE id NOT IN (
+                    SELECT MIN(id) FROM questions GROUP BY content_hash);
+
+                DROP INDEX IF EXISTS questions_type_index;
+                UPDATE questions SET type_index = (
+                    SELECT COUNT(*) FROM questions AS q
+                    WHERE q.type = questions.type AND q.id < questions.id);
+            """)
+
+    def count(self, q_type: str) -> int:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT COUNT(*) FROM questions WHERE type = ?", (q_type,)).fetchone()
+
+        return row[0]
+
+    def row_to_dict(self, row: sqlite3.Row) -> Dict:
+        question = dict(row)
+        question["incorrect_answers"] = json.loads(
+            question["incorrect_answers"])
+        question["index"] = question.pop("id")
+
+        return question
+
+    def get(self, q_type: str, type_index: int) -> Optional[Dict]:
+        # Position of the question among questions of its type
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM questions WHERE type = ? AND type_index = ?",
+                (q_type, type_index)).fetchone()
+
+        return self.row_to_dict(row) if row is not None else None
+
+    def find(self,
+             q_type: str,
+             category: Optional[str] = None,
+             difficulty: Optional[str] = None,
+             limit: int = 100) -> List[Dict]:
+        query = "SELECT * FROM questions WHERE type = ?"
+        params = [q_type]
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        if difficulty is not None:
+            query += " AND difficulty = ?"
+            params.append(difficulty)
+        query += " LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+
+        return [self.row_to_dict(row) for row in rows]
+
+    def insert(self, questions: Iterable[Dict]) -> int:
+        with self.lock, self.connection:
+            # Next free position of every type
+            next_indexes = dict(self.connection.execute(
+                "SELECT type, MAX(type_index) + 1 FROM questions GROUP BY type").fetchall())
+
+            inserted = 0
+            for question in questions:
+                q_type = question["type"]
+                type_index = next_indexes.get(q_type, 0)
+
+                # Questions that are already stored are skipped
+                cursor = self.connection.execute(
+                    """INSERT OR IGNORE INTO questions (type, type_index, category, difficulty, question,
+                                                        correct_answer, incorrect_answers, content_hash)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (q_type, type_index, question.get("category"), question.get("difficulty"),
+                     question["question"], question["correct_answer"],
+                     json.dumps(question["incorrect_answers"]), question["content_hash"]))
+
+                if cursor.rowcount == 1:
+                    next_indexes[q_type] = type_index + 1
+                    inserted += 1
+
+        return inserted
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+class QuestionIngestor:
+    def __init__(self,
+                 question_bank: QuestionBank) -> None:
+        self.question_bank = question_bank
+
+        # Stats
+        self.inserted = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return re.sub(r"\s+", " ", html.unescape(text)).strip()
+
+    @staticmethod
+    def normalize(question: Dict) -> Dict:
+        return {"type": question["type"],
+                "category": QuestionIngestor.normalize_text(question.get("category", "")),
+                "difficulty": question.get("difficulty"),
+                "question": QuestionIngestor.normalize_text(question["question"]),
+                "correct_answer": QuestionIngestor.normalize_text(question["correct_answer"]),
+                "incorrect_answers": [QuestionIngestor.normalize_text(answer)
+                                      for answer in question["incorrect_answers"]]}
+
+    @staticmethod
+    def content_hash(question: Dict) -> str:
+        # Order of incorrect answers does not make a new question
+        content = [question["type"], question["question"],
+                   question["correct_answer"], sorted(question["incorrect_answers"])]
+        return hashlib.sha1(json.dumps(content).encode("utf-8")).hexdigest()
+
+    def ingest(self, batch: Iterable[Dict]) -> Tuple[int, int]:
+        questions = []
+        for question in batch:
+            question = self.normalize(question)
+            question["content_hash"] = self.content_hash(question)
+            questions.append(question)
+
+        inserted = self.question_bank.insert(questions)
+        duplicates = len(questions) - inserted
+
+        self.inserted += inserted
+        self.duplicates += duplicates
+
+        return inserted, duplicates
+
+    def import_json(self, json_path: str, batch_size: int = 1000) -> int:
+        # Import questions saved by the previous versions of OpentdbAPIHandler
+        with open(json_path, "r") as file:
+            questions = json.load(file)
+
+        inserted = 0
+        for start in range(0, len(questions), batch_size):
+            inserted += self.ingest(questions[start:start + batch_size])[0]
+
+        print(f"{inserted} questions were imported from {os.path.basename(json_path)}.")
+
+        return inserted
@@ -1,56 +1,76 @@
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Deque, Optional
+from collections import deque
 
 import os
-import json
 import random
 
 import pygame
 
 from .sound import VoiceMaker
+from .fonts import font_pool, TextFitter
+from .atlas import atlas
+from .layers import Layer
+from .question_bank import QuestionBank, QuestionIngestor
+from .votes import VoteTally
+from .sampler import QuestionSampler
 
 
 class QuizGetter:
     def __init__(self,
-                 json_dir: str) -> None:
-        # Paths
+                 json_dir: str,
+                 db_name: str = "questions.db",
+                 avoid_last: int = 100,
+                 state_dir: Optional[str] = None) -> None:
+        # Paths, every game running on the same bank needs its own state dir
         self.json_dir = json_dir
-        self.mult_q_path = os.path.join(
-            json_dir, "trivia_questions_multiple.json")
-        self.bool_q_path = os.path.join(
-            json_dir, "trivia_questions_boolean.json")
-
-        # JSONs
-        self.mult_q_dict = self.load_json(json_path=self.mult_q_path)
-        self.bool_q_dict = self.load_json(json_path=self.bool_q_path)
-
-        # Length of the dicts
-        self.mult_q_len = len(self.mult_q_dict)
-        self.bool_q_len = len(self.bool_q_dict)
-
-        # Indexes that was used before
-        self.mult_idxs: List[int] = []
-        self.bool_idxs: List[int] = []
-
-    def load_json(self, json_path: str) -> List[Dict[str, str]]:
-        with open(json_path, 'r') as file:
-            data = json.load(file)
-
-        return data
+        self.state_dir = state_dir if state_dir is not None else json_dir
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        # Question bank, created from JSONs on the first run
+        self.question_bank = self.open_bank(json_dir, db_name)
+
+        # Length of the bank
+        self.mult_q_len = self.question_bank.count("multiple")
+        self.bool_q_len = self.question_bank.count("boolean")
+
+        # Samplers of unused questions, saved so a restart does not repeat them
+        self.mult_sampler = QuestionSampler(size=self.mult_q_len,
+                                            state_path=os.path.join(
+                                                self.state_dir, "sampler_multiple.bin"),
+                                            avoid_last=avoid_last)
+        self.bool_sampler = QuestionSampler(size=self.bool_q_len,
+                                            state_path=os.path.join(
+                                                self.state_dir, "sampler_boolean.bin"),
+                                            avoid_last=avoid_last)
+
+    @staticmethod
+    def open_bank(json_dir: str,
+                  db_name: str = "questions.db",
+                  read_only: bool = True) -> QuestionBank:
+        # Games only read an existing bank, tables are created and migrated once
+        db_path = os.path.join(json_dir, db_name)
+        is_new_bank = not os.path.exists(db_path)
+        question_bank = QuestionBank(db_path=db_path,
+                                     read_only=read_only is True and is_new_bank is False)
+
+        if is_new_bank:
+            ingestor = QuestionIngestor(question_bank=question_bank)
+            for q_type in ("multiple", "boolean"):
+                json_path = os.path.join(json_dir, f"trivia_questions_{q_type}.json")
+                if os.path.exists(json_path):
+                    ingestor.import_json(json_path)
+
+        return question_bank
 
     def get_random_question(self, q_type: str) -> Dict:
         assert q_type in [
             "multiple", "boolean"], "Type of the question must be one of ['multiple', 'boolean']."
 
-        # Choose dict and idxs
-        q_dict = self.mult_q_dict if q_type == "multiple" else self.bool_q_dict
-        used_idxs = self.mult_idxs if q_type == "multiple" else self.bool_idxs
-
-        # Choose random index from free indexes
-        free_idxs = [i for i in range(len(q_dict)) if i not in used_idxs]
-        rand_idx = random.choice(free_idxs)
-        used_idxs.append(rand_idx)
+        # Choose next unused index
+        sampler = self.mult_sampler if q_type == "multiple" else self.bool_sampler
+        rand_idx = sampler.next()
 
-        return q_dict[rand_idx]
+        return self.question_bank.get(q_type, rand_idx)
 
 
 class QuizHandler:
@@ -61,14 +81,28 @@ class QuizHandler:
                  screen_size: Tuple[int, int],
                  question_color: Tuple[int, int, int] = (255, 255, 255),
                  answer_color: Tuple[int, int, int] = (0, 0, 0),
-                 font_name: str = "Rubik-Medium.ttf") -> None:
+                 font_name: str = "Rubik-Medium.ttf",
+                 synthesizer=None,
+                 prefetch: int = 2,
+                 state_dir: Optional[str] = None,
+                 quiz_getter: Optional[QuizGetter] = None) -> None:
 
         # Paths
         self.font_path = os.path.join(font_dir, font_name)
 
-        # Guiz getter
-        self.quiz_getter = QuizGetter(json_dir=json_dir)
-        self.quiz = self.quiz_getter.get_random_question(q_type="multiple")
+        # Voice
+        self.voice_maker = VoiceMaker(source_dir=source_dir,
+                                      synthesizer=synthesizer)
+
+        # Guiz getter, questions after the current one are queued
+        # so their voices are synthesized ahead
+        if quiz_getter is None:
+            quiz_getter = QuizGetter(json_dir=json_dir,
+                                     state_dir=state_dir)
+        self.quiz_getter = quiz_getter
+        self.prefetch = prefetch
+        self.upcoming: Deque[Dict] = deque()
+        self.quiz = self.next_quiz()
 
         # Question and answers
         self.question_handler = QuestionHandler(question=self.quiz['question'],
@@ -80,30 +114,56 @@ class QuizHandler:
                                               incorrect_answers=self.quiz["incorrect_answers"],
                                               screen_size=screen_size,
                                               font_path=self.font_path,
-                                              color=answer_color)
-
-        # Voice
-        self.voice_maker = VoiceMaker(source_dir=source_dir)
+                                              color=answer_color,
+                                              correct_idx=self.quiz["correct_idx"])
 
         # Screen
         self.screen_size = screen_size
 
-    def render(self, screen: pygame.Surface,  gift_counter: Dict[str, int]) -> None:
-        self.question_handler.render(screen)
-        self.answers_handler.render(screen, gift_counter)
+    def prepare_quiz(self) -> Dict:
+        quiz = self.quiz_getter.get_random_question(q_type="multiple").copy()
+
+        # Order of answers is fixed in advance, it is a part of the voice
+        quiz["correct_idx"] = random.randint(0, len(quiz["incorrect_answers"]))
+        quiz["answers"] = quiz["incorrect_answers"].copy()
+        quiz["answers"].insert(quiz["correct_idx"], quiz["correct_answer"])
+
+        return quiz
+
+    def next_quiz(self) -> Dict:
+        if len(self.upcoming) == 0:
+            self.upcoming.append(self.prepare_quiz())
+
+        quiz = self.upcoming.popleft()
+        while len(self.upcoming) < self.prefetch:
+            self.upcoming.append(self.prepare_quiz())
+
+        # Current quiz is synthesized first
+        for q in [quiz, *self.upcoming]:
+            self.voice_maker.prefetch(q["question"], q["answers"], q["correct_idx"])
+
+        return quiz
+
+    def render(self, screen: pygame.Surface, vote_tally: VoteTally) -> List[pygame.Rect]:
+        dirty_rects = self.question_handler.render(screen)
+        dirty_rects += self.answers_handler.render(screen, vote_tally)
         self.voice_maker.make_voice(
             "q_and_a", self.question_handler.question, self.answers_handler.answers)
 
-    def show_answer(self, screen: pygame.Surface) -> None:
-        self.answers_handler.show_answer(screen)
+        return dirty_rects
+
+    def show_answer(self, screen: pygame.Surface) -> List[pygame.Rect]:
+        dirty_rects = self.answers_handler.show_answer(screen)
         self.voice_maker.make_voice(
             "right_answer", self.answers_handler.answers[self.answers_handler.correct_idx])
 
+        return dirty_rects
+
     def update_quiz(self) -> None:
-        self.quiz = self.quiz_getter.get_random_question(q_type="multiple")
+        self.quiz = self.next_quiz()
         self.question_handler.update_question(self.quiz['question'])
         self.answers_handler.update_answers(
-            self.quiz["correct_answer"], self.quiz["incorrect_answers"])
+            self.quiz["correct_answer"], self.quiz["incorrect_answers"], self.quiz["correct_idx"])
         self.voice_maker.update_voices()
 
 
@@ -131,7 +191,9 @@ class QuestionHandler:
 
         self.question = question
 
+        self.fitter = TextFitter(font_path=font_path)
         self.setup_font()
+        self.setup_text_surface()
 
     @property
     def rect(self) -> pygame.Rect:
@@ -146,58 +208,39 @@ class QuestionHandler:
         pygame.draw.rect(screen, (255, 255, 255), self.rect, 2)
 
     def setup_font(self) -> None:
-        self.font_size = self.calculate_font_size()
-        self.font = pygame.font.Font(self.font_path, self.font_size)
-        self.space_width = self.font.size(' ')[0]
-
-    def calculate_font_size(self) -> int:
-        max_font_size = 50
-        words = self.question.split(' ')
-
-        for font_size in range(max_font_size, 0, -1):
-            font = pygame.font.Font(self.font_path, font_size)
-            space_width = font.size(' ')[0]
-
-            if self.does_text_fit(font, words, space_width):
-                return font_size
+        # Fit font size and line breaks to the rect
+        self.font, self.lines = self.fitter.fit(self.question,
+                                                self.rect.width,
+                                                self.rect.height)
 
-        return 1
+    def setup_text_surface(self) -> None:
+        # Render the laid out question once, frames only blit it
+        self.text_surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.drawn = False
+        line_height = self.font.get_height()
 
-    def does_text_fit(self, font: pygame.font.Font, words: list, space_width: int) -> bool:
-        x, y = 0, 0
-        max_y = 0
-
-        for word in words:
-            word_surface = font.render(word, True, self.color)
-            word_width, word_height = word_surface.get_size()
-            if x + word_width > self.rect.width:
-                x = 0
-                y += word_height
-            x += word_width + space_width
-            max_y = max(max_y, y + word_height)
-
-        return max_y <= self.rect.height and x <= self.rect.width
+        for i, line in enumerate(self.lines):
+            line_surface = self.font.render(line, True, self.color)
+            self.text_surface.blit(line_surface, (0, i * line_height))
 
     def render_words(self, screen: pygame.Surface) -> None:
-        words = self.question.split(' ')
-
-        x, y = self.rect.x, self.rect.y
-        for word in words:
-            word_surface = self.font.render(word, True, self.color)
-            word_width, word_height = word_surface.get_size()
-            if x + word_width >= self.rect.right:
-                x = self.rect.x
-                y += word_height
-            screen.blit(word_surface, (x, y))
-            x += word_width + self.space_width
-
-    def render(self, screen: pygame.Surface) -> None:
+        screen.blit(self.text_surface, self.rect.topleft)
+
+    def render(self, screen: pygame.Surface) -> List[pygame.Rect]:
         # self.draw_rect(screen)
         self.render_words(screen)
 
+        # Question changes the screen only on the first frame after update
+        if self.drawn is True:
+            return []
+
+        self.drawn = True
+        return [self.rect.copy()]
+
     def update_question(self, new_question: str) -> None:
         self.question = new_question
         self.setup_font()
+        self.setup_text_surface()
 
 
 class AnswersHandler:
@@ -206,7 +249,8 @@ class AnswersHandler:
                  incorrect_answers: List[str],
                  screen_size: Tuple[int, int],
                  font_path: str,
-                 color: Tuple[int, int]) -> None:
+                 color: Tuple[int, int],
+                 correct_idx: Optional[int] = None) -> None:
         """
         Initialize the AnswersHandler with given answers, screen size, font, and color.
 
@@ -215,6 +259,7 @@ class AnswersHandler:
         :param screen_size: Tuple containing screen width and height
         :param font_path: Path to the font file
         :param color: Tuple containing the RGB color values
+        :param correct_idx: Position of the correct answer, random if None
         """
         self.width, self.height = screen_size
         self.font_path = font_path
@@ -235,15 +280,25 @@ class AnswersHandler:
 
         # Gift counter
         self.counter_size = 20
-        self.counter_font = pygame.font.Font(self.font_path, self.counter_size)
+        self.counter_font = font_pool.get(self.font_path, self.counter_size)
         self.counter_color = (255, 255, 255)
         self.counter_surface_color = (90, 35, 40)
 
-        self.update_answers(correct_answer, incorrect_answers)
+        # Circles and letters, kept between rounds with the same layout
+        self.chrome: Optional[Layer] = None
+
+        # Text fitting
+        self.fitter = TextFitter(font_path=font_path)
+
+        self.update_answers(correct_answer, incorrect_answers, correct_idx)
 
-    def setup_answers(self, correct_answer: str, incorrect_answers: List[str]) -> None:
+    def setup_answers(self,
+                      correct_answer: str,
+                      incorrect_answers: List[str],
+                      correct_idx: Optional[int] = None) -> None:
         self.answers = incorrect_answers.copy()
-        self.correct_idx = random.randint(0, len(incorrect_answers))
+        self.correct_idx = correct_idx if correct_idx is not None else random.randint(
+            0, len(incorrect_answers))
         self.answers.insert(self.correct_idx, correct_answer)
 
     @property
@@ -281,139 +336,172 @@ class AnswersHandler:
             # Adjust margin
             abs_h_margin += answer_height + abs_inter_h_margin
 
+        self.letter_items = [self.get_letter_item(i)
+                             for i in range(len(self.answers))]
+
+        # Fill of every answer box, boxes are refilled only when it changes
+        self.fill_colors: List[Optional[int]] = [None] * len(self.answers)
+
+        # Circles and letters do not depend on votes or answer texts, only on the layout
+        chrome_rect = self.get_circle_rect(0).unionall(
+            [self.get_circle_rect(i) for i in range(len(self.answers))] +
+            [rect for _, rect in self.letter_items])
+        if self.chrome is None or self.chrome.rect != chrome_rect:
+            self.chrome = Layer(chrome_rect)
+        self.chrome_key = tuple(tuple(rect) for rect in self.answer_rects)
+
     def draw_answers(self,
                      screen: pygame.Surface,
                      i: int,
-                     gift_counter: Dict[int, int] = None,
                      color=(255, 0, 40),
-                     draw_rectangle=True,
                      factor=1) -> None:
-        # Answers rect
-        if draw_rectangle is True:
-            fill_ratio = gift_counter[i] / (sum(gift_counter.values()) + 1)
-            fill_color = max(100, min(255, int(fill_ratio * 255) + 100))
-            self.answer_surfaces[i].fill(
-                self.counter_surface_color + (fill_color,))
-            pygame.draw.rect(self.answer_surfaces[i], (0, 255, 0, 255),
-                             self.answer_rects[i], width=0,
-                             border_top_right_radius=30, border_bottom_right_radius=30)
-            screen.blit(self.answer_surfaces[i], self.answer_rects[i].topleft)
-
         # Circless
         pygame.draw.circle(screen, color,
                            self.answer_rects[i].midleft, self.answer_rects[i].height / 2 * factor)
         # Letter
-        letter_font = pygame.font.Font(
-            self.font_path, int(self.letter_size * factor))
-        letter = letter_font.render(
-            self.letters[i], True, self.letter_color)
-        letter_rect = letter.get_rect(center=self.answer_rects[i].midleft)
-        screen.blit(letter, letter_rect)
-
-    def draw(self, screen: pygame.Surface, gift_counter: Dict[int, int]) -> None:
+        atlas.blit(screen, *self.get_letter_item(i, factor))
+
+    def get_letter_item(self, i: int, factor: float = 1) -> Tuple[tuple, pygame.Rect]:
+        letter_key = atlas.glyph(self.font_path, int(self.letter_size * factor),
+                                 self.letters[i], self.letter_color)
+        letter_rect = atlas.get(letter_key).get_rect(
+            center=self.answer_rects[i].midleft)
+
+        return letter_key, letter_rect
+
+    def draw_chrome(self, color=(255, 0, 40)) -> None:
+        self.chrome.clear(self.chrome_key)
+
+        # Circles
+        for rect in self.answer_rects:
+            pygame.draw.circle(self.chrome.surface, color,
+                               self.chrome.local(rect.midleft), rect.height / 2)
+
+        # Letters
+        self.chrome.blits(self.letter_items)
+
+    def draw_boxes(self, screen: pygame.Surface, vote_tally: VoteTally) -> None:
+        # Fill follows every vote, so boxes are blitted directly
+        for i, fill_ratio in enumerate(vote_tally.shares):
+            fill_color = max(100, min(255, int(fill_ratio * 255) + 100))
+            if fill_color != self.fill_colors[i]:
+                self.answer_surfaces[i].fill(
+                    self.counter_surface_color + (fill_color,))
+                pygame.draw.rect(self.answer_surfaces[i], (0, 255, 0, 255),
+                                 self.answer_rects[i], width=0,
+                                 border_top_right_radius=30, border_bottom_right_radius=30)
+                self.fill_colors[i] = fill_color
+
+            screen.blit(self.answer_surfaces[i], self.answer_rects[i].topleft)
+
+    def draw(self, screen: pygame.Surface, vote_tally: VoteTally) -> None:
         # # Draw main rect
         # pygame.draw.rect(screen, (255, 255, 255), self.rect, 2)
 
-        # Draw answers rect and circles
-        for i in range(len(self.answers)):
-            self.draw_answers(screen, i, gift_counter=gift_counter)
+        # Answer boxes, then circles and letters from the layer of the round
+        self.draw_boxes(screen, vote_tally)
+        if not self.chrome.is_valid(self.chrome_key):
+            self.draw_chrome()
+        self.chrome.render(screen)
 
     def setup_fonts(self) -> None:
-        self.fonts = [self.create_font(answer, rect) for answer, rect in zip(
-            self.answers, self.answer_rects)]
-
-    def create_font(self, answer: str, rect: pygame.Rect) -> pygame.font.Font:
-        max_font_size = 50
-        words = answer.split(' ')
-
-        for font_size in range(max_font_size, 0, -1):
-            font = pygame.font.Font(self.font_path, font_size)
-            space_width = font.size(' ')[0]
-            x = self.text_margin * rect.width
-            max_y = 0
-            y = 0
-
-            for word in words:
-                word_surface = font.render(word, True, self.color)
-                word_width, word_height = word_surface.get_size()
-                if x + word_width > rect.width:
-                    x = self.text_margin * rect.width
-                    y += word_height
-                x += word_width + space_width
-                max_y = max(max_y, y + word_height)
-
-            if max_y <= rect.height:
-                return font
-
-        return pygame.font.Font(self.font_path, 1)
+        # Fit font size and line breaks of every answer to its rect
+        self.fonts = []
+        self.lines = []
+        for answer, rect in zip(self.answers, self.answer_rects):
+            font, lines = self.fitter.fit(answer,
+                                          rect.width * (1 - self.text_margin),
+                                          rect.height)
+            self.fonts.append(font)
+            self.lines.append(lines)
+
+    def setup_text_surface(self) -> None:
+        # Render all laid out answers once, frames only blit the result
+        self.text_surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+
+        # Counts and counter rects of the last frame
+        self.last_counts = None
+        self.last_counter_rects: List[pygame.Rect] = []
+        self.answer_shown = False
+
+        for lines, rect, font in zip(self.lines, self.answer_rects, self.fonts):
+            line_height = font.get_height()
+            y_offset = (rect.height - len(lines) * line_height) / 2
+
+            x = rect.x - self.rect.x + self.text_margin * rect.width
+            y = rect.y - self.rect.y + y_offset
+
+            for line in lines:
+                line_surface = font.render(line, True, self.color)
+                self.text_surface.blit(line_surface, (x, y))
+                y += line_height
 
     def render_words(self, screen: pygame.Surface) -> None:
-        for answer, rect, font in zip(self.answers, self.answer_rects, self.fonts):
-            words = answer.split(' ')
-            space_width = font.size(' ')[0]
-
-            total_height = self.calculate_total_height(words, font, rect.width)
-            y_offset = (rect.height - total_height) / 2
-
-            x = rect.x + self.text_margin * rect.width
-            y = rect.y + y_offset
-            line_width = 0
-            current_line_height = 0
-
-            for word in words:
-                word_surface = font.render(word, True, self.color)
-                word_width, word_height = word_surface.get_size()
-
-                if line_width + word_width >= rect.width - self.text_margin * rect.width:
-                    x = rect.x + self.text_margin * rect.width
-                    y += current_line_height
-                    current_line_height = word_height
-                    line_width = 0
-
-                screen.blit(word_surface, (x, y))
-                x += word_width + space_width
-                line_width += word_width + space_width
-                current_line_height = max(current_line_height, word_height)
-
-    def render_counter(self, screen: pygame.Surface, gift_counter: Dict[int, int]) -> None:
-        for k, count in gift_counter.items():
+        screen.blit(self.text_surface, self.rect.topleft)
+
+    def render_counter(self, screen: pygame.Surface, vote_tally: VoteTally) -> List[pygame.Rect]:
+        counter_rects = []
+        for k, count in enumerate(vote_tally.totals):
             # Draw numbers
             word_surface = self.counter_font.render(
-                str(count), True, self.counter_color, self.color)
+                str(round(count)), True, self.counter_color, self.color)
             coords = (self.answer_rects[k].right + word_surface.get_width() / 3, self.answer_rects[k].top -
                       word_surface.get_height() / 2)
-            screen.blit(
-                word_surface, coords)
-
-    def calculate_total_height(self, words: List[str], font: pygame.font.Font, rect_width: int) -> int:
-        space_width = font.size(' ')[0]
-        line_width = 0
-        max_line_height = 0
-        total_height = 0
-
-        for word in words:
-            word_width, word_height = font.size(word)
-            if line_width + word_width >= rect_width - self.text_margin * rect_width:
-                total_height += max_line_height
-                line_width = 0
-                max_line_height = word_height
-
-            line_width += word_width + space_width
-            max_line_height = max(max_line_height, word_height)
-
-        total_height += max_line_height
-        return total_height
-
-    def render(self, screen: pygame.Surface, gift_counter: Dict[int, int]) -> None:
-        self.draw(screen, gift_counter)
+            counter_rects.append(screen.blit(
+                word_surface, coords))
+
+        return counter_rects
+
+    def get_dirty_rects(self,
+                        vote_tally: VoteTally,
+                        counter_rects: List[pygame.Rect]) -> List[pygame.Rect]:
+        counts = tuple(vote_tally.totals)
+        if counts == self.last_counts:
+            return []
+
+        # Any vote changes fill of every answer and its counter
+        dirty_rects = [self.rect.copy()] + \
+            self.last_counter_rects + counter_rects
+        if self.last_counts is None:
+            dirty_rects += [self.get_circle_rect(i)
+                            for i in range(len(self.answers))]
+
+        self.last_counts = counts
+        self.last_counter_rects = counter_rects
+
+        return dirty_rects
+
+    def get_circle_rect(self, i: int, factor: float = 1) -> pygame.Rect:
+        radius = self.answer_rects[i].height / 2 * factor
+        rect = pygame.Rect(0, 0, 2 * radius + 2, 2 * radius + 2)
+        rect.center = self.answer_rects[i].midleft
+
+        return rect
+
+    def render(self, screen: pygame.Surface, vote_tally: VoteTally) -> List[pygame.Rect]:
+        self.draw(screen, vote_tally)
         self.render_words(screen)
-        self.render_counter(screen, gift_counter)
+        counter_rects = self.render_counter(screen, vote_tally)
 
-    def show_answer(self, screen: pygame.Surface):
+        return self.get_dirty_rects(vote_tally, counter_rects)
+
+    def show_answer(self, screen: pygame.Surface) -> List[pygame.Rect]:
         self.draw_answers(screen, self.correct_idx, color=(
-            0, 255, 40), draw_rectangle=False, factor=1.2)
+            0, 255, 40), factor=1.2)
+
+        # Highlighted answer changes the screen only on the first frame
+        if self.answer_shown is True:
+            return []
+
+        self.answer_shown = True
+        return [self.get_circle_rect(self.correct_idx, factor=1.2)]
 
-    def update_answers(self, new_correct_answer: str, new_incorrect_answers: List[str]) -> None:
-        self.setup_answers(new_correct_answer, new_incorrect_answers)
+    def update_answers(self,
+                       new_correct_answer: str,
+                       new_incorrect_answers: List[str],
+                       correct_idx: Optional[int] = None) -> None:
+        self.setup_answers(new_correct_answer,
+                           new_incorrect_answers, correct_idx)
         self.setup_rects()
         self.setup_fonts()
+        self.setup_text_surface()
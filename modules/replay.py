@@ -0,0 +1,83 @@
+from typing import Iterable, Iterator, Optional
+
+import gzip
+import json
+import time
+import threading
+
+from .events import GiftEvent
+
+
+def open_log(path: str, mode: str):
+    # Logs ending with .gz are compressed
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+class GiftRecorder:
+    def __init__(self, path: str) -> None:
+        # Every line is [ms since the first event, user, gift, count, value]
+        self.path = path
+        self.file = open_log(path, "w")
+        self.start_time: Optional[float] = None
+        self.count = 0
+
+    def record(self, events: Iterable[GiftEvent]) -> None:
+        for event in events:
+            if self.start_time is None:
+                self.start_time = event.timestamp
+
+            offset = round((event.timestamp - self.start_time) * 1000, 1)
+            self.file.write(json.dumps([offset, event.user, event.gift, event.count, event.value],
+                                       separators=(",", ":")) + "\n")
+            self.count += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class GiftReplayer:
+    def __init__(self,
+                 path: str,
+                 event_queue,
+                 speed: float = 1) -> None:
+        # Speed 0 replays events as fast as possible
+        self.path = path
+        self.event_queue = event_queue
+        self.speed = speed
+
+        self.count = 0
+        self.done = threading.Event()
+        self.thread = None
+
+    def read(self) -> Iterator[list]:
+        with open_log(self.path, "r") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.replay, daemon=True)
+        self.thread.start()
+
+    def replay(self) -> None:
+        start_time = time.perf_counter()
+
+        # Logs recorded before gift values have no value column
+        for offset, user, gift, count, *value in self.read():
+            if self.speed > 0:
+                delay = start_time + offset / 1000 / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            # Latency is measured from the moment the event is replayed
+            self.event_queue.put(GiftEvent(user=user,
+                                           gift=gift,
+                                           count=count,
+                                           timestamp=time.time(),
+                                           value=value[0] if value else 1))
+            self.count += 1
+
+        self.done.set()
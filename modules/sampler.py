@@ -0,0 +1,124 @@
+from typing import Optional
+
+import os
+import json
+import random
+from array import array
+
+
+class QuestionSampler:
+    def __init__(self,
+                 size: int,
+                 state_path: Optional[str] = None,
+                 avoid_last: int = 0) -> None:
+        # Questions are drawn in the order of a shuffled permutation,
+        # the cursor points to the next one
+        self.size = size
+        self.permutation = array('I')
+        self.cursor = 0
+
+        # Number of the last questions of the previous pass which
+        # are not repeated at the start of the next one
+        self.avoid_last = avoid_last
+
+        # State on disk, permutation and cursor are saved separately
+        self.state_path = state_path
+        self.cursor_path = state_path + ".json" if state_path is not None else None
+
+        if not self.load_state():
+            self.reshuffle()
+
+    def load_state(self) -> bool:
+        if self.state_path is None or not os.path.exists(self.cursor_path):
+            return False
+
+        try:
+            with open(self.cursor_path, "r") as file:
+                state = json.load(file)
+
+            permutation = array('I')
+            with open(self.state_path, "rb") as file:
+                permutation.fromfile(file, state["size"])
+        except (OSError, ValueError, EOFError, KeyError):
+            print("Sampler state is broken, questions are reshuffled.")
+            return False
+
+        self.permutation = permutation
+        self.cursor = state["cursor"]
+
+        # Bank was changed since the state was saved
+        if state["size"] != self.size:
+            self.resize(self.size)
+
+        return True
+
+    def save_permutation(self) -> None:
+        if self.state_path is None:
+            return
+
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            self.permutation.tofile(file)
+        os.replace(tmp_path, self.state_path)
+
+    def save_cursor(self) -> None:
+        if self.cursor_path is None:
+            return
+
+        tmp_path = self.cursor_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"size": len(self.permutation),
+                      "cursor": self.cursor}, file)
+        os.replace(tmp_path, self.cursor_path)
+
+    def reshuffle(self) -> None:
+        # Last questions of the previous pass
+        avoid_last = min(self.avoid_last, self.size // 2)
+        recent = set(self.permutation[-avoid_last:]) if avoid_last > 0 else set()
+
+        permutation = array('I', range(self.size))
+        random.shuffle(permutation)
+
+        # Move recent questions away from the start of the new pass
+        for i in range(avoid_last):
+            if permutation[i] in recent:
+                j = random.randrange(avoid_last, self.size)
+                while permutation[j] in recent:
+                    j = random.randrange(avoid_last, self.size)
+                permutation[i], permutation[j] = permutation[j], permutation[i]
+
+        self.permutation = permutation
+        self.cursor = 0
+        self.save_permutation()
+        self.save_cursor()
+
+    def resize(self, size: int) -> None:
+        if size < len(self.permutation):
+            # Questions were removed, start a new pass over the bank
+            self.size = size
+            self.permutation = array('I')
+            self.reshuffle()
+            return
+
+        # Insert new questions at random places among the unused ones
+        for idx in range(len(self.permutation), size):
+            self.permutation.append(idx)
+            j = random.randrange(self.cursor, len(self.permutation))
+            self.permutation[-1], self.permutation[j] = self.permutation[j], self.permutation[-1]
+
+        self.size = size
+        self.save_permutation()
+        self.save_cursor()
+
+    def next(self) -> int:
+        assert self.size > 0, "Sampler has no questions to draw."
+
+        if self.cursor >= len(self.permutation):
+            print("All questions were used, questions are reshuffled.")
+            self.reshuffle()
+
+        idx = self.permutation[self.cursor]
+        self.cursor += 1
+        self.save_cursor()
+
+        return idx
@@ -1,13 +1,28 @@
+from typing import Tuple, List, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
 import os
+import wave
+import asyncio
+import threading
 import random
 
 from pygame import mixer
-import edge_tts
+
+from .voice_cache import VoiceCache
+from .assets import AssetManager
+from .audio import AudioManager
 
 
 class SoundMaker:
     def __init__(self,
-                 source_dir: str) -> None:
+                 source_dir: str,
+                 assets: AssetManager,
+                 music_bytes: int = 64 * 1024 * 1024) -> None:
+        # Shared sounds
+        self.assets = assets
+
         # Paths
         self.sounds_dir = os.path.join(source_dir, "sounds")
         self.music_dir = os.path.join(self.sounds_dir, "music")
@@ -20,15 +35,18 @@ class SoundMaker:
         # Effects
         self.create_effects()
 
-        # Music
+        # Music, the track of the next round is decoded in advance
+        self.audio = AudioManager(max_bytes=music_bytes)
         self.music_listdir = os.listdir(self.music_dir)
         self.music_path = random.choice(self.music_listdir)
+        self.next_music_path = self.choose_music()
         self.music_played = False
+        self.prefetch_music()
 
     def create_effects(self) -> None:
-        self.right_answer_sound = mixer.Sound(
+        self.right_answer_sound = self.assets.sound(
             os.path.join(self.effects_dir, "right_answer.wav"))
-        self.ticking_sound = mixer.Sound(
+        self.ticking_sound = self.assets.sound(
             os.path.join(self.effects_dir, "ticking.mp3"))
 
         self.effects_ch = mixer.Channel(0)
@@ -44,91 +62,232 @@ class SoundMaker:
             self.effects_ch.play(self.ticking_sound, loops=-1)
             self.effect_played[self.effect_types.index('tick')] = True
 
+    def choose_music(self) -> str:
+        # Prefer a track different from the current one
+        choices = [i for i in self.music_listdir if i != self.music_path]
+        return random.choice(choices if choices else self.music_listdir)
+
+    def prefetch_music(self) -> None:
+        for path in (self.music_path, self.next_music_path):
+            self.audio.prefetch(os.path.join(self.music_dir, path))
+
     def play_music(self, volume: float = 0.4) -> None:
+        # Music starts once its track is decoded, frames never wait for it
         if self.music_played is False:
-            mixer.music.load(os.path.join(
-                self.music_dir, self.music_path))
-            mixer.music.set_volume(volume)
-            mixer.music.play(-1)
-            self.music_played = True
+            self.music_played = self.audio.play_music(
+                os.path.join(self.music_dir, self.music_path), volume)
 
     def update_sounds(self) -> None:
         # Change effect played flag
         self.effect_played = [
             False for _ in range(len(self.effect_played))]
 
-        # Change music played flag and choose new music file
+        # Change music played flag and switch to the prefetched music file
         self.music_played = False
-        self.music_path = random.choice(self.music_listdir)
+        self.music_path = self.next_music_path
+        self.next_music_path = self.choose_music()
+        self.prefetch_music()
+
+
+class EdgeTTSSynthesizer:
+    def __init__(self, voice: str = "en-US-AriaNeural") -> None:
+        self.voice = voice
+        self.extension = "mp3"
+
+    def synthesize(self, text: str, rate: str, path: str) -> None:
+        # Imported on the first voice in a worker thread, it takes longer than pygame
+        import edge_tts
+
+        communicate = edge_tts.Communicate(text, self.voice, rate=rate)
+        communicate.save_sync(path)
+
+    async def synthesize_async(self, text: str, rate: str, path: str) -> None:
+        # Streams the voice on the running event loop instead of a worker thread
+        import edge_tts
+
+        communicate = edge_tts.Communicate(text, self.voice, rate=rate)
+        await communicate.save(path)
+
+
+class SilentSynthesizer:
+    def __init__(self,
+                 voice: str = "silent",
+                 duration: float = 0.5,
+                 frequency: int = 22050) -> None:
+        # Local fake of the TTS service for tests and offline runs
+        self.voice = voice
+        self.extension = "wav"
+        self.duration = duration
+        self.frequency = frequency
+
+    def synthesize(self, text: str, rate: str, path: str) -> None:
+        with wave.open(path, "wb") as file:
+            file.setnchannels(1)
+            file.setsampwidth(2)
+            file.setframerate(self.frequency)
+            file.writeframes(bytes(2 * int(self.duration * self.frequency)))
 
 
 class VoiceMaker:
-    def __init__(self, source_dir: str) -> None:
+    def __init__(self,
+                 source_dir: str,
+                 synthesizer=None,
+                 workers: int = 2,
+                 max_voices: int = 16,
+                 cache_bytes: int = 100 * 1024 * 1024) -> None:
         # Paths
         self.sounds_dir = os.path.join(source_dir, "sounds")
         self.voice_dir = os.path.join(self.sounds_dir, "voices")
 
-        self.q_and_a_path = os.path.join(self.voice_dir, "q_and_a.mp3")
-        self.right_answer_path = os.path.join(
-            self.voice_dir, "right_answer.mp3")
+        # Synthesized voices persist between runs
+        self.cache = VoiceCache(cache_dir=self.voice_dir,
+                                max_bytes=cache_bytes)
 
         # Voice
-        self.voice = "en-US-AriaNeural"
+        self.synthesizer = synthesizer if synthesizer is not None else EdgeTTSSynthesizer()
         self.voice_types = ["q_and_a", "right_answer"]
-        self.text_created = [False, False]
+        self.voice_rates = ["-10%", "+0%"]
         self.voice_played = [False, False]
         self.create_channel()
 
+        # Synthesis and decoding run in background threads or tasks of the game loop, both return sounds
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="voice")
+        self.futures: OrderedDict[Tuple[str, str], Union[Future, asyncio.Task]] = OrderedDict()
+        self.max_voices = max_voices
+
     def create_channel(self) -> None:
         self.voice_ch = mixer.Channel(1)
 
-    def create_voice(self, voice_type: str, *args) -> None:
-        # Retrieve text from question and answers
-        if self.text_created[self.voice_types.index('q_and_a')] is False and voice_type == "q_and_a":
+    @staticmethod
+    def create_text(voice_type: str, *args) -> str:
+        if voice_type == "q_and_a":
             # Retrieve question and answers
             question, answers = args
-            answers = answers.copy()
+            return question + "\n" + "\n".join(answers)
 
-            # Create text
-            text = question + "\n" + "\n".join(answers)
+        return args[0]
 
-            # Create voice
-            communicate = edge_tts.Communicate(text, self.voice, rate="-10%")
-            communicate.stream_sync()
-            communicate.save_sync(self.q_and_a_path)
+    def get_tmp_path(self, key: str) -> str:
+        # Games sharing the cache may synthesize the same text at once, each writes its own file
+        return os.path.join(self.voice_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
 
-            # Change flag
-            self.text_created[self.voice_types.index('q_and_a')] = True
+    @staticmethod
+    def remove_tmp(tmp_path: str) -> None:
+        # Failed synthesis may leave a partial file, it is never cached
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-        elif self.text_created[self.voice_types.index('right_answer')] is False and voice_type == "right_answer":
-            text = args[0]
-            # Create voice
-            communicate = edge_tts.Communicate(text, self.voice)
-            communicate.stream_sync()
-            communicate.save_sync(self.right_answer_path)
+    def synthesize(self, text: str, rate: str) -> str:
+        key = self.cache.make_key(text, self.synthesizer.voice, rate)
+        path = self.cache.get(key, self.synthesizer.extension)
+        if path is not None:
+            return path
 
-            # Change flag
-            self.text_created[self.voice_types.index('right_answer')] = True
+        # Write to a temporary file so a half written voice is never cached
+        tmp_path = self.get_tmp_path(key)
+        try:
+            self.synthesizer.synthesize(text, rate, tmp_path)
+        except BaseException:
+            self.remove_tmp(tmp_path)
+            raise
+
+        return self.cache.put(key, tmp_path, self.synthesizer.extension)
+
+    async def synthesize_async(self, text: str, rate: str) -> str:
+        # Cache reads and writes files, only the synthesis runs on the event loop of the game
+        loop = asyncio.get_running_loop()
+        key = self.cache.make_key(text, self.synthesizer.voice, rate)
+        path = await loop.run_in_executor(
+            self.executor, self.cache.get, key, self.synthesizer.extension)
+        if path is not None:
+            return path
+
+        tmp_path = self.get_tmp_path(key)
+        try:
+            await self.synthesizer.synthesize_async(text, rate, tmp_path)
+        except BaseException:
+            # Also when the task is cancelled
+            self.remove_tmp(tmp_path)
+            raise
+
+        return await loop.run_in_executor(
+            self.executor, self.cache.put, key, tmp_path, self.synthesizer.extension)
+
+    def load_voice(self, text: str, rate: str) -> mixer.Sound:
+        # Decode outside of the frame loop
+        return mixer.Sound(self.synthesize(text, rate))
+
+    async def load_voice_async(self, text: str, rate: str) -> mixer.Sound:
+        path = await self.synthesize_async(text, rate)
+
+        # Decoding blocks, so it still runs in a worker thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, mixer.Sound, path)
+
+    def submit(self, text: str, rate: str) -> Union[Future, asyncio.Task]:
+        # Asynchronous synthesizers share the event loop of the game if it runs in one
+        if hasattr(self.synthesizer, "synthesize_async"):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                return loop.create_task(self.load_voice_async(text, rate))
+
+        return self.executor.submit(self.load_voice, text, rate)
+
+    def create_voice(self, voice_type: str, *args) -> Union[Future, asyncio.Task]:
+        rate = self.voice_rates[self.voice_types.index(voice_type)]
+        text = self.create_text(voice_type, *args)
+
+        key = (text, rate)
+        if key not in self.futures:
+            self.futures[key] = self.submit(text, rate)
+            self.remove_old_futures()
+
+        self.futures.move_to_end(key)
+
+        return self.futures[key]
+
+    def remove_old_futures(self) -> None:
+        while len(self.futures) > self.max_voices:
+            _, future = next(iter(self.futures.items()))
+            if not future.done():
+                break
+
+            self.futures.popitem(last=False)
+
+    def prefetch(self, question: str, answers: List[str], correct_idx: int) -> None:
+        self.create_voice("q_and_a", question, answers)
+        self.create_voice("right_answer", answers[correct_idx])
 
     def make_voice(self, voice_type: str, *args, volume=1) -> None:
         assert voice_type in self.voice_types, "Voice type should be one of ['q_and_a', 'right_answer']."
 
-        # Create voice file
-        self.create_voice(voice_type, *args)
+        voice_idx = self.voice_types.index(voice_type)
+        if self.voice_played[voice_idx] is True:
+            return
+
+        # Play voice file only when it is synthesized
+        future = self.create_voice(voice_type, *args)
+        if not future.done():
+            return
+
+        self.voice_played[voice_idx] = True
+        if future.exception() is not None:
+            print(f"Voice was not created: {future.exception()}")
+            return
 
-        # Play voice file
-        if self.voice_played[self.voice_types.index('q_and_a')] is False and voice_type == "q_and_a":
-            q_and_a_sound = mixer.Sound(self.q_and_a_path)
-            self.voice_ch.play(q_and_a_sound)
-            self.voice_played[self.voice_types.index('q_and_a')] = True
+        sound = future.result()
+        sound.set_volume(volume)
+        self.voice_ch.play(sound)
 
-        elif self.voice_played[self.voice_types.index('right_answer')] is False and voice_type == "right_answer":
-            right_answer_sound = mixer.Sound(self.right_answer_path)
-            self.voice_ch.play(right_answer_sound)
-            self.voice_played[self.voice_types.index('right_answer')] = True
+    def close(self) -> None:
+        # Queued voices are dropped, the index keeps the last hits
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
 
     def update_voices(self) -> None:
-        self.text_created = [
-            False for _ in range(len(self.text_created))]
         self.voice_played = [
             False for _ in range(len(self.voice_played))]
@@ -0,0 +1,232 @@
+from typing import Tuple, List, Dict, Optional, Callable, NamedTuple, Sequence
+
+import os
+import time
+import queue
+import signal
+import threading
+import multiprocessing
+
+
+class InstanceConfig(NamedTuple):
+    name: str
+    gift_port: int
+    account: Optional[str] = None
+    cpus: Optional[Tuple[int, ...]] = None
+
+
+def get_process_usage() -> Dict[str, float]:
+    # CPU time and resident memory of the current process
+    times = os.times()
+    usage = {"cpu_s": times.user + times.system}
+
+    try:
+        with open("/proc/self/statm", "r") as file:
+            rss_pages = int(file.read().split()[1])
+        usage["rss_mb"] = rss_pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        import resource
+        usage["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return usage
+
+
+def run_instance(config: InstanceConfig,
+                 game_kwargs: Dict,
+                 stats_queue: multiprocessing.Queue,
+                 stop_event: multiprocessing.Event) -> None:
+    # Supervisor stops games with the event, Ctrl+C is handled by it only
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if config.cpus is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, config.cpus)
+
+    from .game import GameCreator
+
+    def put_stats(frame_stats: Dict[str, float]) -> None:
+        stats_queue.put({"name": config.name,
+                         "pid": os.getpid(),
+                         "time": time.time(),
+                         **get_process_usage(),
+                         **frame_stats})
+
+    game_creator = GameCreator(gift_port=config.gift_port,
+                               headless=True,
+                               stats_callback=put_stats,
+                               **game_kwargs)
+
+    def wait_stop() -> None:
+        stop_event.wait()
+        game_creator.running = False
+
+    threading.Thread(target=wait_stop, daemon=True).start()
+    game_creator.run()
+
+
+class Supervisor:
+    def __init__(self,
+                 json_dir: str,
+                 source_dir: str,
+                 instances: Sequence[InstanceConfig],
+                 screen_size: Tuple[int, int] = (468, 832),
+                 fps: int = 60,
+                 stats_interval: float = 10,
+                 frame_output_prefix: Optional[str] = None,
+                 client_target: Optional[Callable[[str, int], None]] = None,
+                 **game_kwargs) -> None:
+        # Paths shared by all games
+        self.json_dir = json_dir
+        self.source_dir = source_dir
+
+        # Games, each on its own cores
+        self.instances = self.assign_cpus(instances)
+        self.screen_size = screen_size
+        self.fps = fps
+        self.stats_interval = stats_interval
+        self.frame_output_prefix = frame_output_prefix
+        self.game_kwargs = game_kwargs
+
+        # Gift clients, one for every account
+        self.client_target = client_target
+
+        # Spawned processes do not inherit SDL state of the supervisor
+        self.context = multiprocessing.get_context("spawn")
+        self.stats_queue = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.processes: Dict[str, multiprocessing.Process] = {}
+        self.clients: Dict[str, multiprocessing.Process] = {}
+
+        # Last stats of every game
+        self.stats: Dict[str, Dict] = {}
+        self.last_cpu: Dict[str, Tuple[float, float]] = {}
+
+    @staticmethod
+    def assign_cpus(instances: Sequence[InstanceConfig]) -> List[InstanceConfig]:
+        if not hasattr(os, "sched_getaffinity"):
+            return list(instances)
+
+        # Split available cores evenly, games share cores if there are more games
+        cpus = sorted(os.sched_getaffinity(0))
+        per_instance = max(1, len(cpus) // max(1, len(instances)))
+
+        assigned = []
+        for i, config in enumerate(instances):
+            if config.cpus is None:
+                start = (i * per_instance) % len(cpus)
+                config = config._replace(
+                    cpus=tuple(cpus[start:start + per_instance]))
+            assigned.append(config)
+
+        return assigned
+
+    def prepare(self) -> None:
+        # Bank is created and migrated once, games only read it
+        from .quiz import QuizGetter
+        QuizGetter.open_bank(self.json_dir, read_only=False).close()
+
+    def start(self) -> None:
+        self.prepare()
+
+        for config in self.instances:
+            frame_output = None
+            if self.frame_output_prefix is not None:
+                frame_output = f"{self.frame_output_prefix}_{config.name}"
+
+            # Sampler state is per game, so games do not repeat each other's order
+            game_kwargs = {"json_dir": self.json_dir,
+                           "source_dir": self.source_dir,
+                           "screen_size": self.screen_size,
+                           "fps": self.fps,
+                           "stats_interval": self.stats_interval,
+                           "frame_output": frame_output,
+                           "state_dir": os.path.join(self.json_dir, "instances", config.name),
+                           **self.game_kwargs}
+
+            process = self.context.Process(target=run_instance,
+                                           args=(config, game_kwargs,
+                                                 self.stats_queue, self.stop_event),
+                                           name=f"game-{config.name}")
+            process.start()
+            self.processes[config.name] = process
+            self.last_cpu[config.name] = (time.time(), 0.0)
+            print(f"Game {config.name} started, pid {process.pid}, "
+                  f"gift port {config.gift_port}, cpus {config.cpus}.")
+
+            if config.account is not None and self.client_target is not None:
+                self.start_client(config)
+
+    def start_client(self, config: InstanceConfig) -> None:
+        client = self.context.Process(target=self.client_target,
+                                      args=(config.account, config.gift_port),
+                                      name=f"client-{config.name}",
+                                      daemon=True)
+        client.start()
+        self.clients[config.name] = client
+        print(f"Gifts of {config.account} are sent to game {config.name}.")
+
+    def collect_stats(self, timeout: float = 1) -> None:
+        try:
+            stats = self.stats_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        # CPU load since the previous report of the game
+        name = stats["name"]
+        last_time, last_cpu = self.last_cpu.get(name, (None, None))
+        if last_time is not None and stats["time"] > last_time:
+            stats["cpu_percent"] = 100 * (stats["cpu_s"] - last_cpu) / (stats["time"] - last_time)
+        self.last_cpu[name] = (stats["time"], stats["cpu_s"])
+
+        self.stats[name] = stats
+
+    def report(self) -> str:
+        lines = []
+        for config in self.instances:
+            stats = self.stats.get(config.name)
+            alive = self.processes[config.name].is_alive() if config.name in self.processes else False
+            if stats is None:
+                lines.append(f"{config.name}: {'running' if alive else 'stopped'}, no stats yet")
+                continue
+
+            cpu_percent = stats.get("cpu_percent")
+            cpu = f"{cpu_percent:.0f}%" if cpu_percent is not None else "-"
+            lines.append(f"{config.name}: {'running' if alive else 'stopped'}, "
+                         f"cpu {cpu}, rss {stats['rss_mb']:.0f} MB, "
+                         f"{stats['fps']:.1f} FPS, work p50/p99 "
+                         f"{stats['work_p50_ms']:.2f}/{stats['work_p99_ms']:.2f} ms, "
+                         f"missed {stats['missed_deadlines']}/{stats['frames']}")
+
+        return "\n".join(lines)
+
+    def monitor(self, duration: Optional[float] = None) -> None:
+        # Collect stats until all games stop, Ctrl+C or the duration runs out
+        start_time = time.time()
+        report_time = start_time
+        try:
+            while any(process.is_alive() for process in self.processes.values()):
+                self.collect_stats()
+
+                if time.time() - report_time >= self.stats_interval:
+                    print(self.report())
+                    report_time = time.time()
+
+                if duration is not None and time.time() - start_time >= duration:
+                    break
+        except KeyboardInterrupt:
+            pass
+
+        self.stop()
+
+    def stop(self, timeout: float = 10) -> None:
+        self.stop_event.set()
+        for process in self.processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        for client in self.clients.values():
+            client.terminate()
+
+        # Stats sent while the games were stopping
+        while not self.stats_queue.empty():
+            self.collect_stats(timeout=0.1)
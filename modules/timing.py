@@ -0,0 +1,190 @@
+from typing import Dict, Optional, List, Tuple, Iterator
+from collections import deque
+from contextlib import contextmanager
+
+import time
+import asyncio
+import threading
+
+
+class FrameScheduler:
+    def __init__(self,
+                 fps: int = 60,
+                 history: int = 1000,
+                 spin_time: float = 0.002) -> None:
+        # Frame budget
+        self.fps = fps
+        self.frame_budget = 1 / fps
+
+        # Time before the deadline that is busy-waited instead of slept,
+        # time.sleep may wake up late by about a millisecond
+        self.spin_time = spin_time
+
+        # Times of the last frames in seconds
+        self.frame_times = deque(maxlen=history)
+        self.work_times = deque(maxlen=history)
+
+        # Counters
+        self.frames = 0
+        self.missed_deadlines = 0
+
+        self.frame_start: Optional[float] = None
+        self.deadline: Optional[float] = None
+
+    def start(self) -> None:
+        self.frame_start = time.perf_counter()
+        self.deadline = self.frame_start + self.frame_budget
+
+    def sleep_until(self, deadline: float) -> None:
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+
+        while time.perf_counter() < deadline:
+            pass
+
+    def finish_work(self) -> Optional[float]:
+        # Returns the deadline to wait for, None if the frame is late
+        if self.frame_start is None:
+            self.start()
+
+        now = time.perf_counter()
+        self.work_times.append(now - self.frame_start)
+
+        if now > self.deadline:
+            # Frame is late, start counting from now instead of catching up
+            self.missed_deadlines += 1
+            self.deadline = now + self.frame_budget
+            return None
+
+        deadline = self.deadline
+        self.deadline += self.frame_budget
+
+        return deadline
+
+    def tick(self) -> float:
+        deadline = self.finish_work()
+        if deadline is not None:
+            self.sleep_until(deadline)
+
+        return self.finish_frame()
+
+    async def tick_async(self) -> float:
+        # Other tasks of the loop run while the frame waits
+        deadline = self.finish_work()
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+            await asyncio.sleep(max(0.0, remaining - self.spin_time))
+            self.sleep_until(deadline)
+        else:
+            await asyncio.sleep(0)
+
+        return self.finish_frame()
+
+    def finish_frame(self) -> float:
+        # Time between the starts of two frames
+        frame_end = time.perf_counter()
+        frame_time = frame_end - self.frame_start
+        self.frame_times.append(frame_time)
+        self.frame_start = frame_end
+        self.frames += 1
+
+        return frame_time
+
+    @staticmethod
+    def percentile(values: deque, q: float) -> float:
+        if len(values) == 0:
+            return 0.0
+
+        values = sorted(values)
+        index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+
+        return values[index]
+
+    def stats(self) -> Dict[str, float]:
+        mean_frame_time = sum(self.frame_times) / max(1, len(self.frame_times))
+
+        stats = {"frames": self.frames,
+                 "missed_deadlines": self.missed_deadlines,
+                 "fps": 1 / mean_frame_time if mean_frame_time > 0 else 0.0,
+                 "budget_ms": self.frame_budget * 1000}
+
+        # Percentiles in milliseconds
+        for name, values in (("frame", self.frame_times), ("work", self.work_times)):
+            for q in (50, 95, 99):
+                stats[f"{name}_p{q}_ms"] = self.percentile(values, q) * 1000
+
+        return stats
+
+    def report(self) -> str:
+        stats = self.stats()
+
+        return (f"{stats['fps']:.1f} FPS, "
+                f"frame p50/p95/p99 {stats['frame_p50_ms']:.2f}/{stats['frame_p95_ms']:.2f}/{stats['frame_p99_ms']:.2f} ms, "
+                f"work p50/p95/p99 {stats['work_p50_ms']:.2f}/{stats['work_p95_ms']:.2f}/{stats['work_p99_ms']:.2f} ms, "
+                f"missed {stats['missed_deadlines']}/{stats['frames']} deadlines of {stats['budget_ms']:.2f} ms")
+
+
+class LatencyTracker:
+    def __init__(self, history: int = 100000) -> None:
+        # Latencies of the last events in seconds
+        self.latencies = deque(maxlen=history)
+        self.count = 0
+
+    def add(self, now: float, timestamps) -> None:
+        for timestamp in timestamps:
+            self.latencies.append(now - timestamp)
+        self.count += len(timestamps)
+
+    def stats(self) -> Dict[str, float]:
+        stats = {"events": self.count,
+                 "max_ms": max(self.latencies, default=0.0) * 1000}
+        for q in (50, 95, 99):
+            stats[f"p{q}_ms"] = FrameScheduler.percentile(
+                self.latencies, q) * 1000
+
+        return stats
+
+    def report(self) -> str:
+        stats = self.stats()
+
+        return (f"{stats['events']} events, "
+                f"latency p50/p95/p99 {stats['p50_ms']:.2f}/{stats['p95_ms']:.2f}/{stats['p99_ms']:.2f} ms, "
+                f"max {stats['max_ms']:.2f} ms")
+
+
+class StartupTimer:
+    def __init__(self, start_time: Optional[float] = None) -> None:
+        # Phases as (name, start, duration) in seconds since the start
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.phases: List[Tuple[str, float, float]] = []
+        self.lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float) -> None:
+        with self.lock:
+            self.phases.append((name, start - self.start_time, end - start))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # Phases may run in other threads at the same time
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter())
+
+    def mark(self, name: str) -> float:
+        now = time.perf_counter()
+        self.add(name, now, now)
+
+        return now - self.start_time
+
+    def report(self) -> str:
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+
+        lines = [f"  {name:<12} {start * 1000:8.1f} ms +{duration * 1000:7.1f} ms"
+                 for name, start, duration in phases]
+        total = max((start + duration for _, start, duration in phases), default=0.0)
+
+        return "\n".join([f"Startup {total * 1000:.1f} ms:"] + lines)
@@ -0,0 +1,205 @@
+from typing import Dict, List, Optional, Set
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import os
+import json
+import time
+import string
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Without it games sharing the cache still merge indexes, but may overwrite each other's writes
+    fcntl = None
+
+
+class VoiceCache:
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int = 100 * 1024 * 1024,
+                 index_name: str = "index.json",
+                 save_interval: float = 30) -> None:
+        # Paths
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, index_name)
+        self.lock_path = f"{self.index_path}.lock"
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Entries from the least to the most recently used
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, Dict] = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        # Hits only reorder entries, the index is written on changes or at most once per interval
+        self.save_interval = save_interval
+        self.save_time = time.time()
+        self.index_changed = False
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+        self.load_index()
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str) -> str:
+        key = "\n".join([voice, rate, text])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def index_lock(self):
+        # Games sharing the cache read, merge and write the index one at a time,
+        # the lock is released when the file is closed
+        with open(self.lock_path, "a") as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            yield
+
+    def read_index(self) -> List[Dict]:
+        if not os.path.exists(self.index_path):
+            return []
+
+        try:
+            with open(self.index_path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            print("Voice cache index is broken, it is rebuilt from files.")
+            return []
+
+    def scan_files(self, files: Set[str]) -> List[Dict]:
+        # Voices missing from the index, e.g. written by a game that crashed
+        entries = []
+        for file_name in files:
+            key, extension = os.path.splitext(file_name)
+            if len(key) != 64 or not set(key) <= set(string.hexdigits) or extension == ".tmp":
+                continue
+
+            path = os.path.join(self.cache_dir, file_name)
+            entries.append({"key": key,
+                            "file": file_name,
+                            "size": os.path.getsize(path),
+                            "last_used": os.path.getmtime(path)})
+
+        return entries
+
+    def merge(self, entries: List[Dict], files: Set[str]) -> None:
+        # Entries of all games, files removed by other games are forgotten
+        merged = {key: entry for key, entry in self.entries.items() if entry["file"] in files}
+        for entry in entries:
+            if entry["file"] not in files:
+                continue
+
+            old_entry = merged.get(entry["key"])
+            if old_entry is None or old_entry["last_used"] < entry["last_used"]:
+                merged[entry["key"]] = entry
+
+        self.entries = OrderedDict((entry["key"], entry) for entry in sorted(
+            merged.values(), key=lambda e: e["last_used"]))
+        self.total_bytes = sum(entry["size"] for entry in self.entries.values())
+
+    def load_index(self) -> None:
+        with self.index_lock():
+            files = set(os.listdir(self.cache_dir))
+            self.merge(self.read_index(), files)
+            self.merge(self.scan_files(files - {entry["file"] for entry in self.entries.values()}),
+                       files)
+
+            # Budget may have changed or orphaned files were found
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+                self.save_index()
+
+    def save_index(self) -> None:
+        # Several games may share the cache, each writes its own temporary file
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(list(self.entries.values()), file)
+        os.replace(tmp_path, self.index_path)
+
+        self.save_time = time.time()
+        self.index_changed = False
+
+    def sync(self) -> None:
+        # Size limit applies to files of all games sharing the cache
+        with self.index_lock():
+            self.merge(self.read_index(), set(os.listdir(self.cache_dir)))
+            self.evict()
+            self.save_index()
+
+    def get(self, key: str, extension: Optional[str] = None) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.adopt(key, extension)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry["last_used"] = time.time()
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.index_changed = True
+            if time.time() - self.save_time >= self.save_interval:
+                self.sync()
+
+            return os.path.join(self.cache_dir, entry["file"])
+
+    def adopt(self, key: str, extension: Optional[str]) -> Optional[Dict]:
+        # File written by another game sharing the cache
+        if extension is None:
+            return None
+
+        file_name = f"{key}.{extension}"
+        path = os.path.join(self.cache_dir, file_name)
+        if not os.path.exists(path):
+            return None
+
+        size = os.path.getsize(path)
+        entry = {"key": key,
+                 "file": file_name,
+                 "size": size,
+                 "last_used": time.time()}
+        self.entries[key] = entry
+        self.total_bytes += size
+
+        return entry
+
+    def put(self, key: str, file_path: str, extension: str) -> str:
+        file_name = f"{key}.{extension}"
+        path = os.path.join(self.cache_dir, file_name)
+        os.replace(file_path, path)
+
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self.total_bytes -= old_entry["size"]
+
+            size = os.path.getsize(path)
+            self.entries[key] = {"key": key,
+                                 "file": file_name,
+                                 "size": size,
+                                 "last_used": time.time()}
+            self.total_bytes += size
+
+            self.sync()
+
+        return path
+
+    def evict(self) -> None:
+        # Remove least recently used files, the newest one is always kept
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry["size"]
+
+            path = os.path.join(self.cache_dir, entry["file"])
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.index_changed is True:
+                self.sync()
@@ -0,0 +1,93 @@
+from typing import Dict, Deque, Iterable, List, Optional, Tuple
+from collections import deque
+
+from .events import GiftEvent
+
+
+class VoteTally:
+    def __init__(self,
+                 gift_indexes: Dict[str, int],
+                 gift_weights: Optional[Dict[str, float]] = None,
+                 user_limit: Optional[float] = None,
+                 user_window: Optional[float] = None) -> None:
+        # Answer of every gift and number of votes it is worth,
+        # gifts without a weight are worth their value
+        self.gift_indexes = gift_indexes
+        self.gift_weights = gift_weights if gift_weights is not None else {}
+        self.answers_count = max(gift_indexes.values()) + 1
+
+        # Votes of a user in the round, or in the last user_window seconds
+        # of the round, are capped by user_limit
+        self.user_limit = user_limit
+        self.user_window = user_window
+
+        # Events submitted by sources, coalesced once per frame
+        self.pending: Deque[GiftEvent] = deque()
+
+        self.reset()
+
+    def reset(self) -> None:
+        # Totals and shares exposed to the renderer
+        self.totals: List[float] = [0] * self.answers_count
+        self.shares: List[float] = [0.0] * self.answers_count
+        self.total = 0
+
+        # Votes of users in the sliding window
+        self.user_votes: Dict[str, Deque[Tuple[float, float]]] = {}
+        self.user_sums: Dict[str, float] = {}
+
+    def submit(self, events: Iterable[GiftEvent]) -> None:
+        # Deque appends are thread safe, sources may submit from any thread
+        self.pending.extend(events)
+
+    def limit_votes(self, user: str, timestamp: float, votes: float) -> float:
+        window = self.user_votes.get(user)
+        if window is None:
+            window = self.user_votes[user] = deque()
+            self.user_sums[user] = 0
+
+        # Forget votes that left the window
+        if self.user_window is not None:
+            while window and window[0][0] <= timestamp - self.user_window:
+                self.user_sums[user] -= window.popleft()[1]
+
+        votes = min(votes, self.user_limit - self.user_sums[user])
+        if votes <= 0:
+            return 0
+
+        window.append((timestamp, votes))
+        self.user_sums[user] += votes
+
+        return votes
+
+    def update(self) -> bool:
+        # Take only events that were submitted before this frame
+        events_count = len(self.pending)
+        if events_count == 0:
+            return False
+
+        increments = [0] * self.answers_count
+        popleft = self.pending.popleft
+        gift_indexes = self.gift_indexes
+        gift_weights = self.gift_weights
+        for _ in range(events_count):
+            event = popleft()
+            idx = gift_indexes.get(event.gift)
+            if idx is None:
+                continue
+
+            votes = event.count * gift_weights.get(event.gift, event.value)
+            if self.user_limit is not None:
+                votes = self.limit_votes(event.user, event.timestamp, votes)
+            increments[idx] += votes
+
+        if not any(increments):
+            return False
+
+        for idx, votes in enumerate(increments):
+            self.totals[idx] += votes
+        self.total = sum(self.totals)
+        # One extra vote in the total, as gifts_counter did, so a single vote does not fill its answer
+        self.shares = [votes / (self.total + 1) for votes in self.totals]
+
+        return True
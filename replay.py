@@ -0,0 +1,72 @@
+import os
+import json
+import time
+import argparse
+import threading
+
+# Run without display and sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from modules.game import GameCreator  # noqa: E402
+from modules.replay import GiftReplayer  # noqa: E402
+from modules.sound import SilentSynthesizer  # noqa: E402
+
+HOME = os.getcwd()
+JSON_DIR = os.path.join(HOME, 'data')
+SOURCE_DIR = os.path.join(HOME, 'source')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded gift events into a headless game.")
+    parser.add_argument("log_path", type=str,
+                        help="Log written with GameCreator(record_path=...).")
+    parser.add_argument("--speed", type=float, default=1,
+                        help="Replay speed, 0 replays as fast as possible.")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--tail", type=float, default=1,
+                        help="Seconds to keep running after the last event.")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Path of the JSON report.")
+    args = parser.parse_args()
+
+    game_creator = GameCreator(json_dir=JSON_DIR,
+                               source_dir=SOURCE_DIR,
+                               screen_size=(468, 832),
+                               fps=args.fps,
+                               stats_interval=0,
+                               synthesizer=SilentSynthesizer(),
+                               gift_port=None)
+
+    replayer = GiftReplayer(path=args.log_path,
+                            event_queue=game_creator.gift_events,
+                            speed=args.speed)
+
+    # Stop the game when all events are replayed and displayed
+    def stop_game() -> None:
+        replayer.done.wait()
+        time.sleep(args.tail)
+        game_creator.running = False
+
+    replayer.start()
+    threading.Thread(target=stop_game, daemon=True).start()
+
+    start_time = time.perf_counter()
+    game_creator.run()
+
+    report = {"log_path": args.log_path,
+              "speed": args.speed,
+              "duration_s": time.perf_counter() - start_time,
+              "replayed_events": replayer.count,
+              "frames": game_creator.scheduler.stats(),
+              "latency": game_creator.latency_tracker.stats()}
+
+    print(json.dumps(report, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import argparse
+
+from modules.supervisor import Supervisor, InstanceConfig
+
+HOME = os.getcwd()
+JSON_DIR = os.path.join(HOME, 'data')
+SOURCE_DIR = os.path.join(HOME, 'source')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run several headless games, one for every TikTok account.")
+    parser.add_argument("accounts", type=str, nargs="*",
+                        help="TikTok accounts, their gifts go to games in the same order.")
+    parser.add_argument("--instances", type=int, default=None,
+                        help="Number of games, the number of accounts by default.")
+    parser.add_argument("--base-port", type=int, default=5577,
+                        help="Gift port of the first game, next games use the next ports.")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--stats-interval", type=float, default=10)
+    parser.add_argument("--frame-output", type=str, default=None,
+                        help="Prefix of shared memory names the frames are written to.")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Seconds to run, until Ctrl+C by default.")
+    args = parser.parse_args()
+
+    count = args.instances if args.instances is not None else max(1, len(args.accounts))
+    instances = [InstanceConfig(name=str(i),
+                                gift_port=args.base_port + i,
+                                account=args.accounts[i] if i < len(args.accounts) else None)
+                 for i in range(count)]
+
+    # TikTok clients are only needed if there are accounts
+    client_target = None
+    if args.accounts:
+        from tiktok import run_client
+        client_target = run_client
+
+    supervisor = Supervisor(json_dir=JSON_DIR,
+                            source_dir=SOURCE_DIR,
+                            instances=instances,
+                            fps=args.fps,
+                            stats_interval=args.stats_interval,
+                            frame_output_prefix=args.frame_output,
+                            client_target=client_target)
+    supervisor.start()
+    supervisor.monitor(duration=args.duration)
+    print(supervisor.report())
+
+
+if __name__ == "__main__":
+    main()
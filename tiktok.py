@@ -1,42 +1,82 @@
-import pyautogui
+from typing import Optional, Union
+
+import time
+import argparse
 
 from TikTokLive import TikTokLiveClient
 from TikTokLive.events import ConnectEvent, GiftEvent
 from TikTokLive.proto.custom_proto import ExtendedGiftStruct
 
-gifts_dict = {"chocolate": "1",
-              "ice_cream": "2",
-              "rose": "3",
-              "soccer": "4"}
+from modules.events import GiftEvent as QuizGiftEvent, GiftEventQueue, GiftEventSender
+
+# Gifts of answers A, B, C, D
+quiz_gifts = ("chocolate", "ice_cream", "rose", "soccer")
+
+
+def create_client(unique_id: str = '@livequizmaster',
+                  port: int = 5577,
+                  event_queue: Optional[GiftEventQueue] = None) -> TikTokLiveClient:
+    client: TikTokLiveClient = TikTokLiveClient(unique_id=unique_id)
+
+    # Gifts are sent to the game as structured events, a streak is one event,
+    # a game on the same event loop gets them without the socket
+    sink = event_queue if event_queue is not None else GiftEventSender(port=port)
 
-client: TikTokLiveClient = TikTokLiveClient(unique_id='@livequizmaster')
+    @client.on(ConnectEvent)
+    async def on_connect(event: ConnectEvent) -> None:
+        print('Connected to Room ID:', client.room_id)
 
+    @client.on(GiftEvent)
+    async def on_gift(event: GiftEvent) -> None:
+        # If it's type 1 and the streak is over
+        if event.gift.info.type == 1:
+            if event.gift.is_repeating == 1:
+                parse_gifts(sink, event.user.unique_id, event.gift, n=event.repeat_count)
+                print(f"{event.user.unique_id} sent {event.repeat_count}x \"{event.gift.name}\"")
 
-@client.on(ConnectEvent)
-async def on_connect(event: ConnectEvent) -> None:
-    print('Connected to Room ID:', client.room_id)
+        # It's not type 1, which means it can't have a streak & is automatically over
+        elif event.gift.info.type != 1:
+            parse_gifts(sink, event.user.unique_id, event.gift)
+            print(f"{event.user.unique_id} sent \"{event.gift.name}\"")
 
+    return client
 
-@client.on(GiftEvent)
-async def on_gift(event: GiftEvent) -> None:
-    # If it's type 1 and the streak is over
-    if event.gift.info.type == 1:
-        if event.gift.is_repeating == 1:
-            parse_gifts(event.gift, n=event.repeat_count)
-            print(f"{event.user.unique_id} sent {
-                  event.repeat_count}x \"{event.gift.name}\"")
 
-    # It's not type 1, which means it can't have a streak & is automatically over
-    elif event.gift.info.type != 1:
-        parse_gifts(event.gift)
-        print(f"{event.user.unique_id} sent \"{event.gift.name}\"")
+def parse_gifts(sink: Union[GiftEventQueue, GiftEventSender],
+                user: str,
+                gift: ExtendedGiftStruct,
+                n: int = 1) -> None:
+    if gift.name not in quiz_gifts:
+        return
 
+    # Diamonds of the gift weight its votes, free gifts count once
+    sink.put(QuizGiftEvent(user=user,
+                           gift=gift.name,
+                           count=n,
+                           timestamp=time.time(),
+                           value=gift.diamond_count or 1))
 
-def parse_gifts(gift: ExtendedGiftStruct, n: int = 1) -> None:
-    for _ in range(n):
-        pyautogui.keyDown(gifts_dict[gift.name])
-        pyautogui.keyUp(gifts_dict[gift.name])
+
+def run_client(unique_id: str, port: int) -> None:
+    create_client(unique_id, port).run()
+
+
+async def run_with_game(game_creator, unique_id: str) -> None:
+    # Client, frame loop and voices share one event loop
+    client = create_client(unique_id, event_queue=game_creator.gift_events)
+    await client.start()
+    try:
+        await game_creator.run_async()
+    finally:
+        await client.disconnect()
 
 
 if __name__ == '__main__':
-    client.run()
+    parser = argparse.ArgumentParser(
+        description="Send gifts of a TikTok live to a game.")
+    parser.add_argument("--account", type=str, default='@livequizmaster')
+    parser.add_argument("--port", type=int, default=5577,
+                        help="Gift port of the game.")
+    args = parser.parse_args()
+
+    run_client(args.account, args.port)